@@ -0,0 +1,96 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
+from typing import List, Optional
+
+from app.db_connect.db import settings
+from app.db_connect.query_stats import track_queries, record_endpoint_queries, endpoint_query_stats
+from app.schemas.admin import ProfilerConfig, ProfileInfo
+from app.services.profiler_service import ProfilerService
+
+# админские эндпоинты доступны только при заданном ADMIN_TOKEN
+def check_admin_token(x_admin_token: Optional[str] = Header(None)):
+    if not settings.ADMIN_TOKEN or x_admin_token != settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Доступ запрещен")
+
+router = APIRouter(prefix="/admin", tags=["Admin"], dependencies=[Depends(check_admin_token)])
+
+# профилирование http запросов: заголовок X-Profile включает его для конкретного запроса
+class ProfilerMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not ProfilerService.config.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        forced = any(name == b"x-profile" for name, _ in scope["headers"])
+        async with ProfilerService.profile(f"{scope['method']} {scope['path']}", forced=forced):
+            await self.app(scope, receive, send)
+
+# считаю SQL запросы каждого http запроса, число и время отдаю в заголовках X-DB-Queries / X-DB-Time-Ms
+class QueryStatsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with track_queries() as stats:
+            async def send_with_stats(message):
+                if message["type"] == "http.response.start":
+                    headers = list(message.get("headers", []))
+                    headers.append((b"x-db-queries", str(stats.count).encode()))
+                    headers.append((b"x-db-time-ms", f"{stats.total_ms:.1f}".encode()))
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            await self.app(scope, receive, send_with_stats)
+
+        # статистику веду по шаблону пути, чтобы /players/1/stats и /players/2/stats попадали в одну строку
+        route = scope.get("route")
+        if route is not None:
+            record_endpoint_queries(f"{scope['method']} {route.path}", stats)
+
+# эндпоинт для статистики SQL запросов по эндпоинтам
+@router.get("/queries")
+async def get_query_stats():
+    return endpoint_query_stats
+
+# эндпоинт для текущих настроек профилирования
+@router.get("/profiler", response_model=ProfilerConfig)
+async def get_profiler_config():
+    return ProfilerService.config
+
+# эндпоинт для включения/выключения профилирования (по запросу, по играм, по доле обработчиков)
+@router.put("/profiler", response_model=ProfilerConfig)
+async def update_profiler_config(config: ProfilerConfig):
+    ProfilerService.config = config
+    return config
+
+# эндпоинт для списка сохраненных профилей медленных обработчиков
+@router.get("/profiler/profiles", response_model=List[ProfileInfo])
+async def list_profiles():
+    return ProfilerService.list_profiles()
+
+# эндпоинт для скачивания профиля: .collapsed для флеймграфа или .prof для pstats/snakeviz
+@router.get("/profiler/profiles/{profile_id}")
+async def download_profile(profile_id: int):
+    profile = ProfilerService.get_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail=f"Профиль с ID {profile_id} не найден")
+
+    if profile["mode"] == "cprofile":
+        filename, media_type = f"profile-{profile_id}.prof", "application/octet-stream"
+    else:
+        filename, media_type = f"profile-{profile_id}.collapsed", "text/plain"
+    return Response(
+        content=profile["data"],
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@router.delete("/profiler/profiles", status_code=204)
+async def clear_profiles():
+    ProfilerService.profiles.clear()
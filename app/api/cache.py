@@ -0,0 +1,35 @@
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+import hashlib
+import json
+from typing import Any, Awaitable, Callable
+
+from app.services.cache_service import response_cache
+
+def etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+# отдаю ответ из кеша (или считаю и кладу в кеш), если у клиента та же версия - 304 без тела
+async def cached_json_response(request: Request, key: str, compute: Callable[[], Awaitable[Any]]) -> Response:
+    cached = response_cache.get(key)
+    if cached is None:
+        data = await compute()
+        body = json.dumps(jsonable_encoder(data), ensure_ascii=False, separators=(",", ":")).encode()
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        response_cache.set(key, body, etag)
+    else:
+        body, etag = cached
+
+    # no-cache: клиент может хранить ответ, но каждый раз сверяет его по ETag
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request, etag):
+        response_cache.not_modified += 1
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -1,11 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
+from datetime import datetime
+from typing import List, Literal, Optional
 
-from app.db_connect.db import get_db
+from app.db_connect.db import get_db, settings
+from app.api.cache import cached_json_response
+from app.services.cache_service import ACTIVE_GAMES_KEY
 from app.services.game_service import GameService
+from app.services.export_service import ExportService
 from app.services.player_service import PlayerService
-from app.schemas.games import GameCreate, Game, GameWithPlayerLogins
+from app.services.reaper_service import ReaperService
+from app.schemas.games import GameCreate, Game, GameWithPlayerLogins, GameBulkResult
 
 router = APIRouter(prefix="/games", tags=["Games"])
 
@@ -33,8 +39,47 @@ async def create_game(
 
     return Game.model_validate(new_game_orm)
 
+# эндпоинт для массового создания игр по списку пар, результат по каждой паре
+@router.post("/create/bulk", response_model=List[GameBulkResult])
+async def create_games_bulk(
+    pairings: List[GameCreate],
+    db: AsyncSession = Depends(get_db)
+):
+    if len(pairings) > settings.BULK_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Не больше {settings.BULK_MAX_ITEMS} пар за запрос")
+    return await GameService.create_games_bulk(db, pairings)
+
 # эндпоинт для получения активных игр
 @router.get("/", response_model=List[GameWithPlayerLogins])
-async def get_active_games(db: AsyncSession = Depends(get_db)):
-    games_with_logins = await GameService.get_active_games(db)
-    return games_with_logins
\ No newline at end of file
+async def get_active_games(request: Request, db: AsyncSession = Depends(get_db)):
+    return await cached_json_response(request, ACTIVE_GAMES_KEY, lambda: GameService.get_active_games(db))
+
+# эндпоинт для выгрузки истории завершенных игр (всех или одного игрока) в NDJSON или CSV
+@router.get("/export")
+async def export_games(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    player_id: Optional[int] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    gzip: bool = Query(False)
+):
+    if date_from is not None and date_to is not None and date_from >= date_to:
+        raise HTTPException(status_code=400, detail="date_from должна быть раньше date_to")
+
+    chunks = ExportService.export_games(format, player_id, date_from, date_to)
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    filename = f"games.{format}"
+    if gzip:
+        chunks = ExportService.gzip_chunks(chunks)
+        media_type = "application/gzip"
+        filename += ".gz"
+    return StreamingResponse(
+        chunks,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+# эндпоинт для метрик фоновой очистки зависших игр
+@router.get("/reaper/metrics")
+async def get_reaper_metrics():
+    return ReaperService.metrics
\ No newline at end of file
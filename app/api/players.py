@@ -1,10 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 
-from app.db_connect.db import get_db
+from app.db_connect.db import get_db, settings
+from app.api.cache import cached_json_response
+from app.services.cache_service import AVAILABLE_PLAYERS_KEY, player_stats_key
 from app.services.player_service import PlayerService
-from app.schemas.players import PlayerCreate, PlayerLogin, Player, PlayerStats
+from app.schemas.players import PlayerCreate, PlayerLogin, Player, PlayerStats, PlayerBulkResult
 
 router = APIRouter(prefix="/players", tags=["Players"])
 
@@ -19,6 +21,16 @@ async def register_player(
         raise HTTPException(status_code=400, detail="Игрок с таким логином уже существует")
     return Player.model_validate(created_player_orm)
 
+# эндпоинт для массовой регистрации игроков (например, для турниров), результат по каждому игроку
+@router.post("/register/bulk", response_model=List[PlayerBulkResult])
+async def register_players_bulk(
+    players_data: List[PlayerCreate],
+    db: AsyncSession = Depends(get_db)
+):
+    if len(players_data) > settings.BULK_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Не больше {settings.BULK_MAX_ITEMS} игроков за запрос")
+    return await PlayerService.register_players_bulk(db, players_data)
+
 # эндпоинт для авторизации игрока
 @router.post("/login", response_model=Player)
 async def login_player(
@@ -32,14 +44,18 @@ async def login_player(
 
 # эндпоинт для получения всех игроков, доступных для игры (статус = 0)
 @router.get("/", response_model=List[Player])
-async def get_available_players(db: AsyncSession = Depends(get_db)):
-    players_pydantic = await PlayerService.get_available_players(db)
-    return players_pydantic
+async def get_available_players(request: Request, db: AsyncSession = Depends(get_db)):
+    return await cached_json_response(
+        request, AVAILABLE_PLAYERS_KEY, lambda: PlayerService.get_available_players(db)
+    )
 
 # эндпоинт для получения статистики игрока
 @router.get("/{player_id}/stats", response_model=PlayerStats)
-async def get_player_stats_endpoint(player_id: int, db: AsyncSession = Depends(get_db)):
-    stats = await PlayerService.get_player_stats(db, player_id)
-    if stats.login == "Unknown":
-        raise HTTPException(status_code=404, detail=f"Игрок с ID {player_id} не найден")
-    return stats
\ No newline at end of file
+async def get_player_stats_endpoint(player_id: int, request: Request, db: AsyncSession = Depends(get_db)):
+    async def compute_stats():
+        stats = await PlayerService.get_player_stats(db, player_id)
+        if stats.login == "Unknown":
+            raise HTTPException(status_code=404, detail=f"Игрок с ID {player_id} не найден")
+        return stats
+
+    return await cached_json_response(request, player_stats_key(player_id), compute_stats)
\ No newline at end of file
@@ -0,0 +1,54 @@
+import json
+import time
+from typing import Dict, Optional, Tuple
+
+from app.db_connect.db import settings
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    # списываю токен, если он есть; токены восстанавливаются со скоростью rate в секунду
+    def consume(self, amount: float = 1.0) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return True
+        return False
+
+# ограничения на одно соединение вебсокета: размер кадра, частота сообщений по типам, счетчик нарушений
+class ConnectionGuard:
+    def __init__(self):
+        self.buckets: Dict[str, TokenBucket] = {
+            "move": TokenBucket(settings.WS_MOVE_RATE, settings.WS_MOVE_BURST),
+            "chat": TokenBucket(settings.WS_CHAT_RATE, settings.WS_CHAT_BURST),
+        }
+        # все остальные типы (auth, ping, неизвестные) делят один общий лимит
+        self.default_bucket = TokenBucket(settings.WS_OTHER_RATE, settings.WS_OTHER_BURST)
+        self.violations = 0
+
+    # разбираю кадр без обращения к бд, возвращаю (данные, ошибка)
+    def parse_frame(self, raw: str) -> Tuple[Optional[dict], Optional[str]]:
+        if len(raw) > settings.WS_MAX_FRAME_BYTES or len(raw.encode()) > settings.WS_MAX_FRAME_BYTES:
+            return None, "Слишком большое сообщение"
+        try:
+            data = json.loads(raw)
+        except json.JSONDecodeError:
+            return None, "Некорректный JSON"
+        if not isinstance(data, dict):
+            return None, "Сообщение должно быть JSON объектом"
+        return data, None
+
+    def allow(self, message_type) -> bool:
+        bucket = self.buckets.get(message_type, self.default_bucket)
+        return bucket.consume()
+
+    # возвращает True, если клиента пора отключать
+    def register_violation(self) -> bool:
+        self.violations += 1
+        return self.violations >= settings.WS_MAX_VIOLATIONS
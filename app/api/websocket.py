@@ -1,19 +1,46 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends
-from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+import asyncio
 import json
-from typing import List, Dict, Optional
-
-from app.db_connect.db import get_db
-from app.services.game_service import GameService
+import logging
+import time
+from datetime import datetime
+from collections import deque
+from sqlalchemy import Row
+from sqlalchemy.orm.exc import StaleDataError
+from typing import Awaitable, Callable, Deque, List, Dict, Optional, Set, Tuple
+
+from app.db_connect.db import settings, AsyncSessionLocal
+from app.db_connect.query_stats import track_queries, record_endpoint_queries
+from app.api.rate_limit import ConnectionGuard
+from app.services.game_service import GameService, BOARD_SIZE, MOVE_MAX_RETRIES
 from app.services.player_service import PlayerService
-from app.db_models.players import PlayersORM
+from app.services.cache_service import invalidate_game_caches
+from app.services.profiler_service import ProfilerService
+from app.logger import bind_log_context
 
 
 router = APIRouter()
+logger = logging.getLogger("app.websocket")
+# отдельный логгер для ходов, его записи сэмплируются (LOG_SAMPLING)
+moves_logger = logging.getLogger("app.moves")
 
 class ConnectionManager:
-    def __init__(self):
+    def __init__(self, buffer_size: int = settings.WS_EVENT_BUFFER_SIZE):
         self.active_connections: Dict[int, List[WebSocket]] = {}
+        # кольцевой буфер последних событий каждой игры: (seq, id игрока, которому событие не отправлялось, сообщение)
+        self.event_buffers: Dict[int, Deque[Tuple[int, Optional[int], str]]] = {}
+        self.last_seq: Dict[int, int] = {}
+        # отложенные поражения за отключение, ключ - (game_id, player_id)
+        self.pending_forfeits: Dict[Tuple[int, int], asyncio.Task] = {}
+        # время последнего сообщения от каждого сокета
+        self.last_seen: Dict[WebSocket, float] = {}
+        # какой игрок авторизовался на сокете
+        self.socket_players: Dict[WebSocket, int] = {}
+        # последнее известное состояние игры (с версией), ход применяется к нему без чтения из бд
+        self.game_states: Dict[int, Row] = {}
+        # логины участников игры, чтобы переподключение обходилось без бд
+        self.game_logins: Dict[int, Dict[int, str]] = {}
+        self.buffer_size = buffer_size
 
     # функции для вебсокета: подключение, отключение, отправка сообщений
     async def connect(self, websocket: WebSocket, game_id: int):
@@ -21,78 +48,282 @@ class ConnectionManager:
         if game_id not in self.active_connections:
             self.active_connections[game_id] = []
         self.active_connections[game_id].append(websocket)
+        self.last_seen[websocket] = time.monotonic()
 
     def disconnect(self, websocket: WebSocket, game_id: int):
+        self.last_seen.pop(websocket, None)
+        self.socket_players.pop(websocket, None)
         if game_id in self.active_connections:
             if websocket in self.active_connections[game_id]:
                 self.active_connections[game_id].remove(websocket)
             if not self.active_connections[game_id]:
                 del self.active_connections[game_id]
 
-    async def broadcast(self, message: str, game_id: int, sender_websocket: WebSocket = None):
+    def touch(self, websocket: WebSocket):
+        self.last_seen[websocket] = time.monotonic()
+
+    def bind_player(self, websocket: WebSocket, player_id: int):
+        self.socket_players[websocket] = player_id
+
+    # есть ли у игрока в игре живой сокет: клиент после обрыва сети может подключиться заново раньше,
+    # чем сервер заметит, что старый сокет мертв
+    def has_player_connection(self, game_id: int, player_id: int) -> bool:
+        return any(
+            self.socket_players.get(connection) == player_id
+            for connection in self.active_connections.get(game_id, ())
+        )
+
+    # игрок ждет хода соперника: молчать в это время нормально
+    def is_waiting_for_opponent(self, game_id: int, websocket: WebSocket) -> bool:
+        player_id = self.socket_players.get(websocket)
+        state = self.game_states.get(game_id)
+        return player_id is not None and state is not None and state.current_turn_player_id != player_id
+
+    # закрываю сокеты, от которых давно не было сообщений, их обработчики уйдут в grace-период
+    # сокет игрока, который ждет соперника, не трогаю; оборванные соединения находят ws ping/pong uvicorn
+    async def close_idle_connections(self, idle_timeout: float) -> int:
+        cutoff = time.monotonic() - idle_timeout
+        idle = [
+            (game_id, connection)
+            for game_id, connections in self.active_connections.items()
+            for connection in connections
+            if self.last_seen.get(connection, 0) < cutoff and not self.is_waiting_for_opponent(game_id, connection)
+        ]
+        for game_id, connection in idle:
+            try:
+                await connection.close(code=1001, reason="Нет активности")
+            except RuntimeError:
+                # сокет уже закрыт
+                pass
+            self.disconnect(connection, game_id)
+        return len(idle)
+
+    # присваиваю событию порядковый номер и кладу его в буфер игры
+    def _record_event(self, game_id: int, payload: dict, excluded_player_id: Optional[int] = None) -> str:
+        seq = self.last_seq.get(game_id, 0) + 1
+        self.last_seq[game_id] = seq
+        message = json.dumps({**payload, "seq": seq})
+
+        buffer = self.event_buffers.get(game_id)
+        if buffer is None:
+            buffer = deque(maxlen=self.buffer_size)
+            self.event_buffers[game_id] = buffer
+        buffer.append((seq, excluded_player_id, message))
+        return message
+
+    async def broadcast(self, payload: dict, game_id: int, sender_websocket: WebSocket = None, sender_id: Optional[int] = None):
+        message = self._record_event(game_id, payload, excluded_player_id=sender_id)
         if game_id in self.active_connections:
             for connection in self.active_connections[game_id]:
                 if connection != sender_websocket:
                     await connection.send_text(message)
 
-    async def broadcast_to_all_in_game(self, message: str, game_id: int):
+    async def broadcast_to_all_in_game(self, payload: dict, game_id: int):
+        message = self._record_event(game_id, payload)
         if game_id in self.active_connections:
             for connection in self.active_connections[game_id]:
                 await connection.send_text(message)
 
+    # досылаю переподключившемуся клиенту события, которые он пропустил (только из памяти, без бд)
+    # если часть событий уже вытеснена из буфера, клиенту хватит актуального состояния из game_start
+    async def replay_missed_events(self, websocket: WebSocket, game_id: int, player_id: int, last_seq: int) -> int:
+        sent = 0
+        for seq, excluded_player_id, message in list(self.event_buffers.get(game_id, ())):
+            if seq > last_seq and excluded_player_id != player_id:
+                await websocket.send_text(message)
+                sent += 1
+        return sent
+
+    # откладываю поражение отключившегося игрока на время grace-периода
+    def schedule_forfeit(self, game_id: int, player_id: int, delay: float, callback: Callable[[], Awaitable[None]]):
+        self.cancel_forfeit(game_id, player_id)
+
+        async def run_forfeit():
+            await asyncio.sleep(delay)
+            self.pending_forfeits.pop((game_id, player_id), None)
+            await callback()
+
+        self.pending_forfeits[(game_id, player_id)] = asyncio.create_task(run_forfeit())
+
+    # возвращает True, если игрок успел переподключиться до поражения
+    def cancel_forfeit(self, game_id: int, player_id: int) -> bool:
+        task = self.pending_forfeits.pop((game_id, player_id), None)
+        if task is None:
+            return False
+        task.cancel()
+        return True
+
+    # закрываю все соединения игры и очищаю ее буфер событий
+    async def close_game(self, game_id: int, reason: str):
+        for conn in list(self.active_connections.get(game_id, [])):
+            self.last_seen.pop(conn, None)
+            self.socket_players.pop(conn, None)
+            await conn.close(code=1000, reason=reason)
+        self.active_connections.pop(game_id, None)
+        self.event_buffers.pop(game_id, None)
+        self.last_seq.pop(game_id, None)
+        self.game_states.pop(game_id, None)
+        self.game_logins.pop(game_id, None)
+        for key in [key for key in self.pending_forfeits if key[0] == game_id]:
+            self.pending_forfeits.pop(key).cancel()
+
 manager = ConnectionManager()
 
+# дешевая проверка хода в памяти, чтобы некорректные ходы не доходили до бд
+def precheck_move(game_id: int, player_id: int, row, col, fired_cells: Set[Tuple[int, int]]) -> Optional[str]:
+    if type(row) is not int or type(col) is not int:
+        return "Необходимо указать row и col (строка и столбец)"
+    if not (0 <= row < BOARD_SIZE and 0 <= col < BOARD_SIZE):
+        return "Некорректные координаты выстрела."
+    if (row, col) in fired_cells:
+        return "В эту клетку уже стреляли"
+    # очередь хода проверяю в памяти, только если оба игрока подключены к этому воркеру: тогда все ходы
+    # игры идут через него и состояние в памяти актуально; иначе соперник мог сходить через другой воркер,
+    # и очередь проверит process_player_move, перечитав игру
+    state = manager.game_states.get(game_id)
+    if (
+        state is not None
+        and state.current_turn_player_id != player_id
+        and manager.has_player_connection(game_id, state.player_1_id)
+        and manager.has_player_connection(game_id, state.player_2_id)
+    ):
+        return "Сейчас не ваш ход!"
+    return None
+
+# засчитываю поражение игроку и завершаю игру
+# использую отдельную короткую сессию, т.к. вызывается и из отложенной задачи после отключения
+# disconnected_at - момент отключения: если игрок после него подключился заново (возможно, к другому
+# воркеру, где отложенное поражение не отменить), поражение не засчитываю
+async def forfeit_game(
+    game_id: int,
+    loser_id: int,
+    event_type: str,
+    reason: str,
+    disconnected_at: Optional[datetime] = None
+):
+    async with AsyncSessionLocal() as db:
+        if disconnected_at is not None and await PlayerService.reconnected_since(db, loser_id, disconnected_at):
+            return
+
+        for _ in range(MOVE_MAX_RETRIES):
+            game = await GameService.get_game_by_id(db, game_id)
+            if not game or not game.online:
+                # игру уже завершили (например, очистка зависших игр), освобождаю ее состояние в памяти воркера
+                await manager.close_game(game_id, reason)
+                return
+
+            # если вышел игрок 1, то победил игрок 2 и наоборот
+            if loser_id == game.player_1_id:
+                game.p_2_res = 1
+                winner_id = game.player_2_id
+            elif loser_id == game.player_2_id:
+                game.p_1_res = 1
+                winner_id = game.player_1_id
+            else:
+                return
+
+            game.online = False
+            game.last_activity = datetime.utcnow()
+            try:
+                await db.commit()
+                break
+            except StaleDataError:
+                # игру успел изменить ход, перечитываю ее и пробую снова
+                await db.rollback()
+        else:
+            return
+        invalidate_game_caches(game.player_1_id, game.player_2_id)
+
+        # обновляю статистику и освобождаю игроков
+        await PlayerService.update_player_stats(db, game, game.player_1_id)
+        await PlayerService.update_player_stats(db, game, game.player_2_id)
+        await PlayerService.logout_player(db, game.player_1_id)
+        await PlayerService.logout_player(db, game.player_2_id)
+
+    # отправляю сообщение для оставшегося игрока об отключении опонента
+    await manager.broadcast_to_all_in_game({"type": event_type, "winner_id": winner_id}, game_id)
+    await manager.close_game(game_id, reason)
+
 # эндпоинт для вебсокета
+# сессия бд берется только на одну единицу работы (загрузка, ход, завершение) и сразу возвращается в пул,
+# пока сокет ждет сообщений, он не держит соединение с бд
 @router.websocket("/games/{game_id}/play")
 async def websocket_game_play(
     websocket: WebSocket,
-    game_id: int,
-    db: AsyncSession = Depends(get_db)
+    game_id: int
 ):
-    # сначала делаю проверку на состояние игры
-    game = await GameService.get_game_by_id(db, game_id)
-    if not game or not game.online:
+    # игра уже идет на этом воркере (например, переподключение): участники известны из памяти
+    cached_game = manager.game_states.get(game_id)
+    player_logins = manager.game_logins.get(game_id)
+    if cached_game is not None and player_logins is not None:
+        game_found = cached_game.online
+        players_found = True
+        player1_id = cached_game.player_1_id
+        player2_id = cached_game.player_2_id
+    else:
+        # иначе делаю проверку на состояние игры, игра и логины игроков читаются одним запросом
+        with track_queries() as query_stats:
+            async with AsyncSessionLocal() as db:
+                cached_game = await GameService.get_move_state_with_logins(db, game_id)
+        record_endpoint_queries("WS connect", query_stats)
+        game_found = cached_game is not None and cached_game.online
+        if game_found:
+            player1_id = cached_game.player_1_id
+            player2_id = cached_game.player_2_id
+            players_found = cached_game.player_1_login is not None and cached_game.player_2_login is not None
+            if players_found:
+                player_logins = {player1_id: cached_game.player_1_login, player2_id: cached_game.player_2_login}
+
+    if not game_found:
         await websocket.close(code=1008, reason="Игра не найдена или завершена")
         return
-
-    player1_id = game.player_1_id
-    player2_id = game.player_2_id
-
-    # получаю orm игроков
-    player1_orm = await db.get(PlayersORM, player1_id)
-    player2_orm = await db.get(PlayersORM, player2_id)
-
-    if not player1_orm or not player2_orm:
+    if not players_found:
         await websocket.close(code=1008, reason="Ошибка: Один из игроков не найден")
         return
 
     await manager.connect(websocket, game_id)
 
     player_id_making_call: Optional[int] = None
-    my_player_orm: Optional[PlayersORM] = None
+    my_login: str = "Unknown"
     is_player1_in_game: bool = False
+    game_online: bool = True
+    guard = ConnectionGuard()
+    # клетки доски противника, по которым этот игрок уже стрелял
+    fired_cells: Set[Tuple[int, int]] = set()
 
     try:
         # идентифицирую игроков
-        auth_message = await websocket.receive_json()
-        if auth_message.get("type") == "auth" and "player_id" in auth_message:
+        auth_message, auth_error = guard.parse_frame(await websocket.receive_text())
+        if auth_error is None and auth_message.get("type") == "auth" and "player_id" in auth_message:
             player_id_making_call = auth_message["player_id"]
 
             if player_id_making_call == player1_id:
-                my_player_orm = player1_orm
                 is_player1_in_game = True
             elif player_id_making_call == player2_id:
-                my_player_orm = player2_orm
                 is_player1_in_game = False
             else:
                 await websocket.close(code=1008, reason="Произошла ошибка")
                 return
-
-            # обновляю статус игрока на "играет"
-            if my_player_orm and my_player_orm.status == 0:
-                 my_player_orm.status = 1
-                 await db.commit()
-                 await db.refresh(my_player_orm)
+            my_login = player_logins[player_id_making_call]
+            # все записи лога этого сокета (и отложенного поражения) будут с game_id и player_id
+            bind_log_context(game_id=game_id, player_id=player_id_making_call)
+
+            # если игрок переподключился в течение grace-периода, отменяю его поражение
+            # переподключением считаю и случай, когда старый сокет игрока еще не закрыт
+            is_resumed = manager.cancel_forfeit(game_id, player_id_making_call)
+            is_resumed = manager.has_player_connection(game_id, player_id_making_call) or is_resumed
+            manager.bind_player(websocket, player_id_making_call)
+
+            # при переподключении статус игрока уже "играет", бд не трогаю
+            # состояние игры беру из памяти воркера или то, что прочитано при подключении сокета
+            if not is_resumed:
+                with track_queries() as query_stats:
+                    async with AsyncSessionLocal() as db:
+                        await PlayerService.set_playing(db, player_id_making_call)
+                record_endpoint_queries("WS auth", query_stats)
+            game = manager.game_states.setdefault(game_id, cached_game)
+            game_online = game.online
+            manager.game_logins[game_id] = player_logins
 
             # отправляю начальное состояние игры
             game_state = {
@@ -100,24 +331,38 @@ async def websocket_game_play(
                 "game_id": game.id,
                 "player1_id": player1_id,
                 "player2_id": player2_id,
-                "player1_login": player1_orm.login,
-                "player2_login": player2_orm.login,
+                "player1_login": player_logins[player1_id],
+                "player2_login": player_logins[player2_id],
                 "my_id": player_id_making_call,
                 "your_board": json.loads(game.board_player_1) if is_player1_in_game else json.loads(game.board_player_2),
                 "opponent_board": json.loads(game.board_player_2) if is_player1_in_game else json.loads(game.board_player_1),
                 "p1_res": game.p_1_res,
                 "p2_res": game.p_2_res,
-                "turn": game.current_turn_player_id
+                "turn": game.current_turn_player_id,
+                "resumed": is_resumed,
+                "seq": manager.last_seq.get(game_id, 0)
             }
+            # клиент передает номер последнего полученного события, досылаю пропущенные
+            # до game_start, чтобы старые move_result не пришли после актуального состояния
+            last_seq = auth_message.get("last_seq")
+            if isinstance(last_seq, int):
+                await manager.replay_missed_events(websocket, game_id, player_id_making_call, last_seq)
+
             await websocket.send_json(game_state)
 
+            for r, row_cells in enumerate(game_state["opponent_board"]):
+                for c, cell_value in enumerate(row_cells):
+                    if cell_value in (2, 3):
+                        fired_cells.add((r, c))
+
             # оповещаю игрока о подключении другого участника
             await manager.broadcast_to_all_in_game(
-                json.dumps({
+                {
                     "type": "player_connected",
                     "player_id": player_id_making_call,
-                    "login": my_player_orm.login if my_player_orm else "Unknown"
-                }),
+                    "login": my_login,
+                    "resumed": is_resumed
+                },
                 game_id
             )
 
@@ -127,146 +372,156 @@ async def websocket_game_play(
 
         # основной цикл обработки сообщений
         while True:
-            data = await websocket.receive_json()
+            raw_message = await websocket.receive_text()
+            manager.touch(websocket)
+
+            # проверяю размер, формат и частоту сообщений, при повторных нарушениях отключаю клиента
+            data, frame_error = guard.parse_frame(raw_message)
+            if frame_error is None and not guard.allow(data.get("type")):
+                frame_error = "Слишком много сообщений, подождите"
+            if frame_error is not None:
+                if guard.register_violation():
+                    await websocket.close(code=1008, reason="Превышены лимиты сообщений")
+                    raise WebSocketDisconnect(code=1008)
+                await websocket.send_json({"type": "error", "message": frame_error, "violations": guard.violations})
+                continue
+
             message_type = data.get("type")
 
-            if message_type == "move":
+            # heartbeat от клиента, чтобы сокет не считался зависшим
+            if message_type == "ping":
+                await websocket.send_json({"type": "pong"})
+
+            elif message_type == "move":
                 target_row = data.get("row")
                 target_col = data.get("col")
 
-                if target_row is None or target_col is None:
-                    await websocket.send_json({"type": "error", "message": "Необходимо указать row и col (строка и столбец)"})
+                move_error = precheck_move(game_id, player_id_making_call, target_row, target_col, fired_cells)
+                if move_error is not None:
+                    await websocket.send_json({"type": "error", "message": move_error})
                     continue
 
-                # обрабатываю ход
-                message, my_board_json_updated, opponent_board_json_updated = await GameService.process_player_move(
-                    db, game_id, player_id_making_call, target_row, target_col
-                )
+                # профилирование хода включается через /admin/profiler, без него это пустой контекст
+                async with ProfilerService.profile("ws.move", game_id=game_id):
+                    with track_queries() as query_stats:
+                        async with AsyncSessionLocal() as db:
+                            # обрабатываю ход, update хода сразу возвращает новое состояние игры
+                            message, my_board_json_updated, opponent_board_json_updated, game = await GameService.process_player_move(
+                                db, game_id, player_id_making_call, target_row, target_col, manager.game_states.get(game_id)
+                            )
+                            if game is not None:
+                                manager.game_states[game_id] = game
+
+                            if my_board_json_updated is not None:
+                                game_online = game.online
+                                current_player_moved_id = player_id_making_call
+
+                                updated_state_message = {
+                                    "type": "move_result",
+                                    "message": message,
+                                    "player_who_moved": current_player_moved_id,
+                                    "your_board": json.loads(my_board_json_updated),
+                                    "opponent_board": json.loads(opponent_board_json_updated),
+                                    "p1_res": game.p_1_res,
+                                    "p2_res": game.p_2_res,
+                                    "is_game_over": not game.online,
+                                    "winner_id": game.player_1_id if game.p_1_res == 1 else (
+                                        game.player_2_id if game.p_2_res == 1 else None),
+                                    "turn": game.current_turn_player_id if game.online else None
+                                }
+
+                                # если игра завершилась, освобождаю игроков (статистику уже обновил process_player_move)
+                                if not game.online:
+                                    await PlayerService.logout_player(db, game.player_1_id)
+                                    await PlayerService.logout_player(db, game.player_2_id)
+                    record_endpoint_queries("WS move" if game_online else "WS move game_over", query_stats)
+                    moves_logger.info(
+                        "Ход %s,%s: %s", target_row, target_col, message,
+                        extra={"row": target_row, "col": target_col, "queries": query_stats.count}
+                    )
 
-                if my_board_json_updated is None:
-                    await websocket.send_json({"type": "error", "message": message})
-                    continue
+                    if my_board_json_updated is None:
+                        await websocket.send_json({"type": "error", "message": message})
+                        continue
 
-                # обновляю состояние игры после хода
-                game = await GameService.get_game_by_id(db, game_id)
-
-                current_player_moved_id = player_id_making_call
-
-                # определяю, чей ход будет следующим
-                next_turn_player_id = None
-                if game.player_1_id == current_player_moved_id:
-                    game.current_turn_player_id = game.player_2_id
-                else:
-                    game.current_turn_player_id = game.player_1_id
-
-                updated_state_message = {
-                    "type": "move_result",
-                    "message": message,
-                    "player_who_moved": current_player_moved_id,
-                    "your_board": json.loads(my_board_json_updated),
-                    "opponent_board": json.loads(opponent_board_json_updated),
-                    "p1_res": game.p_1_res,
-                    "p2_res": game.p_2_res,
-                    "is_game_over": not game.online,
-                    "winner_id": game.player_1_id if game.p_1_res == 1 else (
-                        game.player_2_id if game.p_2_res == 1 else None),
-                    "turn": game.current_turn_player_id if game.online else None
-                }
-
-                await manager.broadcast_to_all_in_game(json.dumps(updated_state_message), game_id)
-
-                # если игра завершилась, обновляю статусы игроков и выставляю игру как неактивную
-                if not game.online:
-                    await PlayerService.update_player_stats(db, game, game.player_1_id)
-                    await PlayerService.update_player_stats(db, game, game.player_2_id)
-
-                    await PlayerService.logout_player(db, game.player_1_id)
-                    await PlayerService.logout_player(db, game.player_2_id)
-
-                    await manager.broadcast_to_all_in_game(
-                        json.dumps({"type": "game_over", "winner_id": updated_state_message["winner_id"]}),
-                        game_id
-                    )
-                    for conn in manager.active_connections.get(game_id, []):
-                        await conn.close(code=1000, reason="Игра завершена")
-                    if game_id in manager.active_connections:
-                        del manager.active_connections[game_id]
+                    fired_cells.add((target_row, target_col))
+                    await manager.broadcast_to_all_in_game(updated_state_message, game_id)
+
+                    if not game_online:
+                        await manager.broadcast_to_all_in_game(
+                            {"type": "game_over", "winner_id": updated_state_message["winner_id"]},
+                            game_id
+                        )
+                        await manager.close_game(game_id, "Игра завершена")
+                        # сокет этого игрока закрыт вместе с игрой, дальше читать из него нечего
+                        return
 
 
             elif message_type == "chat":
                 chat_message_content = data.get("content")
+                if not isinstance(chat_message_content, str) or len(chat_message_content) > settings.WS_CHAT_MAX_LENGTH:
+                    await websocket.send_json({"type": "error", "message": "Некорректное сообщение чата"})
+                    continue
                 if chat_message_content:
                     await manager.broadcast(
-                        json.dumps({
+                        {
                             "type": "chat_message",
                             "sender_id": player_id_making_call,
-                            "sender_login": my_player_orm.login if my_player_orm else "Unknown",
+                            "sender_login": my_login,
                             "content": chat_message_content
-                        }),
+                        },
                         game_id,
-                        sender_websocket=websocket
+                        sender_websocket=websocket,
+                        sender_id=player_id_making_call
                     )
 
     except WebSocketDisconnect:
         # игрок отключился
         manager.disconnect(websocket, game_id)
-
-        if game and game.online:
-            winner_id = None
-            # определяю, кто победил, в случае отключения одного из игрока
-            # если вышел игрок 1, то победил игрок 2 и наоборот
-            if player_id_making_call == game.player_1_id:
-                game.p_2_res = 1
-                winner_id = game.player_2_id
-            elif player_id_making_call == game.player_2_id:
-                game.p_1_res = 1
-                winner_id = game.player_1_id
-
-            if winner_id:
-                game.online = False
-                await db.commit()
-                await db.refresh(game)
-
-                # обновляю статистику
-                await PlayerService.update_player_stats(db, game, player1_id)
-                await PlayerService.update_player_stats(db, game, player2_id)
-
-                # отправляю сообщение для оставшегося игрока об отключении опонента
+        # игру уже завершил ход соперника или сдача: close_game убрал ее из памяти и закрыл этот сокет
+        if game_id not in manager.game_states:
+            game_online = False
+
+        # если у игрока остался другой живой сокет (он уже переподключился), поражение не откладываю
+        if (
+            game_online
+            and player_id_making_call is not None
+            and not manager.has_player_connection(game_id, player_id_making_call)
+        ):
+            disconnected_player_id = player_id_making_call
+            disconnected_at = datetime.utcnow()
+            grace_seconds = settings.WS_RECONNECT_GRACE_SECONDS
+
+            # поражение засчитываю только если игрок не вернулся за grace-период
+            if grace_seconds > 0:
                 await manager.broadcast_to_all_in_game(
-                    json.dumps({"type": "opponent_disconnected", "winner_id": winner_id}),
+                    {
+                        "type": "player_reconnecting",
+                        "player_id": disconnected_player_id,
+                        "grace_seconds": grace_seconds
+                    },
                     game_id
                 )
-                # завершаю игру
-                for conn in manager.active_connections.get(game_id, []):
-                     await conn.close(code=1000, reason="Игрок отключился")
-                if game_id in manager.active_connections:
-                    del manager.active_connections[game_id]
-
-    except Exception as e:
-        print(f"Ошибка вебсокета во время игры: {game_id}: {e}")
+                manager.schedule_forfeit(
+                    game_id,
+                    disconnected_player_id,
+                    grace_seconds,
+                    lambda: forfeit_game(
+                        game_id, disconnected_player_id, "opponent_disconnected", "Игрок отключился", disconnected_at
+                    )
+                )
+            else:
+                await forfeit_game(game_id, disconnected_player_id, "opponent_disconnected", "Игрок отключился")
+
+    except Exception:
+        logger.exception("Ошибка вебсокета во время игры %s", game_id, extra={"game_id": game_id})
         await websocket.close(code=1011, reason="Error")
         manager.disconnect(websocket, game_id)
         # если произошла крит ошибка во время игры, то я ее отключаю
-        if game and game.online:
+        if game_online:
             try:
                 # если игрок 1 отправил запрос из-за которой произошла крит ошибка, то игрок 2 побеждает
-                winner_id = None
-                if player_id_making_call == game.player_1_id:
-                    game.p_2_res = 1
-                    winner_id = game.player_2_id
-                else:
-                    game.p_1_res = 1
-                    winner_id = game.player_1_id
-
-                game.online = False
-                await db.commit()
-                await db.refresh(game)
-                await PlayerService.update_player_stats(db, game, player1_id)
-                await PlayerService.update_player_stats(db, game, player2_id)
-
-                await manager.broadcast_to_all_in_game(
-                    json.dumps({"type": "server_error_game_over", "winner_id": winner_id}),
-                    game_id
-                )
-            except Exception as close_err:
-                print(f"Произошла ошибка во время игры: {close_err}")
+                loser_id = player1_id if player_id_making_call == player1_id else player2_id
+                await forfeit_game(game_id, loser_id, "server_error_game_over", "Error")
+            except Exception:
+                logger.exception("Произошла ошибка во время завершения игры %s", game_id, extra={"game_id": game_id})
@@ -1,19 +1,81 @@
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy import text
 from pydantic_settings import BaseSettings
+import asyncio
+from typing import Dict
+
+from app.db_connect.query_stats import install_query_tracking
 
 class Settings(BaseSettings):
     DATABASE_URL: str = "postgresql+asyncpg://andrey:123123@db:5432/warship_db"
+    # размер пула соединений, все они открываются заранее при прогреве
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    # через сколько секунд переоткрывать соединение пула (вместо pre-ping, который стоит лишний запрос на каждую выдачу)
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    # сколько секунд ждать переподключения игрока, прежде чем засчитать ему поражение
+    WS_RECONNECT_GRACE_SECONDS: float = 30.0
+    # сколько последних событий игры хранить в памяти для переподключившихся клиентов
+    WS_EVENT_BUFFER_SIZE: int = 256
+    # через сколько секунд без сообщений закрывать сокет клиента
+    WS_IDLE_TIMEOUT_SECONDS: float = 300.0
+    # через сколько секунд без активности игра считается брошенной
+    GAME_IDLE_TIMEOUT_SECONDS: float = 600.0
+    # настройки фоновой очистки зависших игр
+    REAPER_INTERVAL_SECONDS: float = 60.0
+    REAPER_BATCH_SIZE: int = 500
+    # лимиты сообщений одного сокета: скорость (в секунду) и запас токенов по типам сообщений
+    WS_MOVE_RATE: float = 2.0
+    WS_MOVE_BURST: int = 5
+    WS_CHAT_RATE: float = 1.0
+    WS_CHAT_BURST: int = 5
+    WS_OTHER_RATE: float = 2.0
+    WS_OTHER_BURST: int = 10
+    # максимальный размер кадра и длина сообщения чата
+    WS_MAX_FRAME_BYTES: int = 4096
+    WS_CHAT_MAX_LENGTH: int = 500
+    # после скольких нарушений закрывать соединение
+    WS_MAX_VIOLATIONS: int = 5
+    # сколько досок держать сгенерированными заранее
+    BOARD_POOL_SIZE: int = 1000
+    # максимальное число элементов в одном bulk запросе
+    BULK_MAX_ITEMS: int = 5000
+    # сколько строк читать из серверного курсора за раз при выгрузке истории игр
+    EXPORT_BATCH_SIZE: int = 1000
+    # кеш ответов списков и статистики
+    RESPONSE_CACHE_TTL_SECONDS: float = 5.0
+    RESPONSE_CACHE_MAX_ENTRIES: int = 1024
+    # токен для /admin эндпоинтов, если пустой - они выключены
+    ADMIN_TOKEN: str = ""
+    # профилирование медленных обработчиков
+    PROFILER_MAX_PROFILES: int = 50
+    PROFILER_SAMPLE_INTERVAL_MS: float = 5.0
+    # логирование: общий уровень, уровни отдельных логгеров и доля пропускаемых записей шумных логгеров
+    # например LOG_LEVELS='{"sqlalchemy.engine": "INFO"}' включает лог sql запросов
+    LOG_LEVEL: str = "INFO"
+    LOG_LEVELS: Dict[str, str] = {"sqlalchemy.engine": "WARNING"}
+    LOG_SAMPLING: Dict[str, float] = {"sqlalchemy.engine": 0.01, "app.moves": 0.1}
+    LOG_JSON: bool = True
+    LOG_QUEUE_SIZE: int = 10000
 
 settings = Settings()
 
 engine = create_async_engine(
     settings.DATABASE_URL,
-    echo=True,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
 )
 
+# счетчик SQL запросов на http запрос и сообщение вебсокета
+install_query_tracking(engine)
+
+# сессии короткие (одна единица работы), поэтому объекты после commit не сбрасываю:
+# иначе обращение к их полям требует неявного запроса, который в async недоступен
 AsyncSessionLocal = async_sessionmaker(
     autocommit=False,
     autoflush=False,
+    expire_on_commit=False,
     bind=engine
 )
 
@@ -22,4 +84,12 @@ async def get_db():
         try:
             yield session
         finally:
-            pass
\ No newline at end of file
+            pass
+
+# заранее открываю все соединения пула, чтобы первые запросы не ждали подключения к бд
+async def warm_up_pool():
+    async def ping():
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+    await asyncio.gather(*(ping() for _ in range(settings.DB_POOL_SIZE)))
\ No newline at end of file
@@ -0,0 +1,92 @@
+from sqlalchemy import text
+import asyncio
+from typing import List, Tuple
+
+from app.db_connect.db import engine
+
+# версионные миграции схемы, запускаются один раз перед стартом воркеров:
+#   python -m app.db_connect.migrations
+# новые миграции только добавляются в конец списка, уже примененные не меняются
+MIGRATIONS: List[Tuple[int, List[str]]] = [
+    (1, [
+        """
+        CREATE TABLE IF NOT EXISTS players (
+            id SERIAL PRIMARY KEY,
+            login VARCHAR NOT NULL,
+            password VARCHAR NOT NULL,
+            stats INTEGER NOT NULL,
+            status INTEGER NOT NULL
+        )
+        """,
+        "CREATE UNIQUE INDEX IF NOT EXISTS ix_players_login ON players (login)",
+        """
+        CREATE TABLE IF NOT EXISTS games (
+            id SERIAL PRIMARY KEY,
+            player_1_id INTEGER NOT NULL,
+            player_2_id INTEGER NOT NULL,
+            p_1_res INTEGER NOT NULL,
+            p_2_res INTEGER NOT NULL,
+            online BOOLEAN NOT NULL,
+            start_date TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            board_player_1 VARCHAR,
+            board_player_2 VARCHAR,
+            current_turn_player_id INTEGER NOT NULL
+        )
+        """,
+    ]),
+    (2, [
+        "ALTER TABLE games ADD COLUMN IF NOT EXISTS last_activity TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT (now() AT TIME ZONE 'utc')",
+        "CREATE INDEX IF NOT EXISTS ix_games_last_activity ON games (last_activity)",
+    ]),
+    (3, [
+        "ALTER TABLE games ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 0",
+    ]),
+    (4, [
+        "ALTER TABLE players ADD COLUMN IF NOT EXISTS last_connected_at TIMESTAMP WITHOUT TIME ZONE",
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+# ключ advisory lock, чтобы несколько одновременно запущенных миграций не мешали друг другу
+MIGRATIONS_LOCK_KEY = 7420001
+
+async def get_schema_version() -> int:
+    async with engine.connect() as conn:
+        exists = await conn.scalar(text("SELECT to_regclass('schema_version') IS NOT NULL"))
+        if not exists:
+            return 0
+        version = await conn.scalar(text("SELECT max(version) FROM schema_version"))
+        return version or 0
+
+async def run_migrations() -> List[int]:
+    applied_now = []
+    async with engine.begin() as conn:
+        await conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATIONS_LOCK_KEY})
+        await conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_version ("
+            "version INTEGER PRIMARY KEY, "
+            "applied_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT (now() AT TIME ZONE 'utc'))"
+        ))
+        result = await conn.execute(text("SELECT version FROM schema_version"))
+        applied = set(result.scalars())
+
+        for version, statements in MIGRATIONS:
+            if version in applied:
+                continue
+            for statement in statements:
+                await conn.execute(text(statement))
+            await conn.execute(text("INSERT INTO schema_version (version) VALUES (:version)"), {"version": version})
+            applied_now.append(version)
+    return applied_now
+
+async def main():
+    applied_now = await run_migrations()
+    await engine.dispose()
+    if applied_now:
+        print(f"Применены миграции: {applied_now}")
+    else:
+        print(f"Схема актуальна, версия {LATEST_VERSION}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,120 @@
+from sqlalchemy import event
+from contextlib import contextmanager
+from contextvars import ContextVar
+import logging
+import time
+from typing import Dict, List, Optional
+
+logger = logging.getLogger("app.db.queries")
+
+# сколько текстов запросов хранить для отчета о превышении бюджета
+MAX_RECORDED_STATEMENTS = 50
+
+# бюджеты SQL запросов на один http запрос (метод + шаблон пути) или одно сообщение вебсокета
+QUERY_BUDGETS: Dict[str, int] = {
+    "POST /players/register": 3,
+    "POST /players/register/bulk": 2,
+    "POST /players/login": 2,
+    "GET /players/": 1,
+    "GET /players/{player_id}/stats": 2,
+    "POST /games/create": 5,
+    "POST /games/create/bulk": 2,
+    "GET /games/": 2,
+    # подключение: игра и логины одним запросом; auth: один update статуса и времени подключения игрока (переподключение - без бд)
+    "WS connect": 1,
+    "WS auth": 1,
+    # один условный update, при конфликте версий еще чтение игры и повторный update
+    # pre-ping у пула выключен, так что это и есть все обращения к бд (ping счетчик бы не увидел)
+    "WS move": 3,
+    # update хода, статистика обоих игроков (чтение + update) и освобождение игроков (update)
+    "WS move game_over": 7,
+}
+
+class QueryStats:
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.statements: List[str] = []
+
+current_query_stats: ContextVar[Optional[QueryStats]] = ContextVar("current_query_stats", default=None)
+
+# считаю запросы, выполненные внутри блока (в том числе во вложенных корутинах)
+@contextmanager
+def track_queries():
+    stats = QueryStats()
+    token = current_query_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        current_query_stats.reset(token)
+
+# подключаю подсчет к движку: события курсора срабатывают на каждый запрос к бд
+# время старта храню в контексте выполнения запроса: он живет один запрос, и если запрос упал
+# (after_cursor_execute не вызывается), на соединении из пула ничего не остается
+def install_query_tracking(engine):
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if context is not None and current_query_stats.get() is not None:
+            context.query_started_at = time.perf_counter()
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        stats = current_query_stats.get()
+        started = getattr(context, "query_started_at", None)
+        if stats is None or started is None:
+            return
+        stats.count += 1
+        stats.total_ms += (time.perf_counter() - started) * 1000
+        if len(stats.statements) < MAX_RECORDED_STATEMENTS:
+            stats.statements.append(statement)
+
+# накопленная статистика по эндпоинтам
+endpoint_query_stats: Dict[str, Dict] = {}
+
+def record_endpoint_queries(endpoint: str, stats: QueryStats):
+    totals = endpoint_query_stats.get(endpoint)
+    if totals is None:
+        totals = {"calls": 0, "queries": 0, "db_time_ms": 0.0, "max_queries": 0, "over_budget": 0}
+        endpoint_query_stats[endpoint] = totals
+    totals["calls"] += 1
+    totals["queries"] += stats.count
+    totals["db_time_ms"] += stats.total_ms
+    totals["max_queries"] = max(totals["max_queries"], stats.count)
+
+    budget = QUERY_BUDGETS.get(endpoint)
+    if budget is not None and stats.count > budget:
+        totals["over_budget"] += 1
+        logger.warning(
+            "Превышен бюджет SQL запросов %s: %d при бюджете %d", endpoint, stats.count, budget,
+            extra={"endpoint": endpoint, "queries": stats.count, "budget": budget}
+        )
+
+def format_budget_error(endpoint: str, count: int, budget: int, statements: List[str]) -> str:
+    listing = "\n".join(f"  {i + 1}. {statement}" for i, statement in enumerate(statements))
+    return f"{endpoint}: {count} SQL запросов при бюджете {budget}\n{listing}"
+
+# хелперы для тестов: падают, если эндпоинт сделал больше запросов, чем положено
+
+@contextmanager
+def assert_query_budget(endpoint: str, budget: Optional[int] = None):
+    budget = QUERY_BUDGETS[endpoint] if budget is None else budget
+    with track_queries() as stats:
+        yield stats
+    if stats.count > budget:
+        raise AssertionError(format_budget_error(endpoint, stats.count, budget, stats.statements))
+
+# для http клиента тестов: число запросов приходит в заголовке X-DB-Queries
+def assert_response_query_budget(response, endpoint: str, budget: Optional[int] = None):
+    budget = QUERY_BUDGETS[endpoint] if budget is None else budget
+    count = int(response.headers["x-db-queries"])
+    if count > budget:
+        raise AssertionError(format_budget_error(endpoint, count, budget, []))
+
+# для вебсокета: обработчик сообщений пишет статистику в endpoint_query_stats, проверяю максимум по всем вызовам
+def assert_endpoint_query_budget(endpoint: str, budget: Optional[int] = None):
+    budget = QUERY_BUDGETS[endpoint] if budget is None else budget
+    totals = endpoint_query_stats.get(endpoint)
+    if totals is None:
+        raise AssertionError(f"{endpoint}: ни одного вызова")
+    if totals["max_queries"] > budget:
+        raise AssertionError(format_budget_error(endpoint, totals["max_queries"], budget, []))
@@ -3,6 +3,10 @@ from sqlalchemy.orm import Mapped, mapped_column
 from datetime import datetime
 from .base import Base
 
+# результат игрока в p_1_res/p_2_res: 1 - победа, 0 - поражение,
+# -1 - игра брошена и закрыта очисткой, ни победы, ни поражения не засчитывается
+RESULT_ABANDONED = -1
+
 class GamesORM(Base):
     __tablename__ = "games"
 
@@ -15,4 +19,12 @@ class GamesORM(Base):
     start_date: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     board_player_1: Mapped[str] = mapped_column(String, nullable=True)
     board_player_2: Mapped[str] = mapped_column(String, nullable=True)
-    current_turn_player_id: Mapped[int] = mapped_column(Integer)
\ No newline at end of file
+    current_turn_player_id: Mapped[int] = mapped_column(Integer)
+    # время последней активности в игре (ход или heartbeat от воркера с открытыми сокетами)
+    # у завершенной игры это время завершения: его обновляют и последний ход, и сдача, и очистка
+    last_activity: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
+    # версия строки: каждое изменение игры ее увеличивает, ход применяется только к той версии, которую видел воркер
+    version: Mapped[int] = mapped_column(Integer, default=0)
+
+    # ORM изменения (сдача, смена статуса) тоже проверяют версию, при конфликте будет StaleDataError
+    __mapper_args__ = {"version_id_col": version}
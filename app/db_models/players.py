@@ -1,5 +1,7 @@
-from sqlalchemy import Integer, String
+from sqlalchemy import Integer, String, DateTime
 from sqlalchemy.orm import Mapped, mapped_column
+from datetime import datetime
+from typing import Optional
 from .base import Base
 
 class PlayersORM(Base):
@@ -9,4 +11,6 @@ class PlayersORM(Base):
     login: Mapped[str] = mapped_column(String, unique=True, index=True)
     password: Mapped[str]
     stats: Mapped[int] = mapped_column(Integer, default=0)
-    status: Mapped[int] = mapped_column(Integer, default=0)
\ No newline at end of file
+    status: Mapped[int] = mapped_column(Integer, default=0)
+    # время последнего подключения к игре (auth по сокету), общий для всех воркеров признак переподключения
+    last_connected_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
\ No newline at end of file
@@ -0,0 +1,133 @@
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from app.db_connect.db import settings
+
+# логирование без блокировки event loop: обработчики в коде только кладут запись в очередь,
+# форматирование в JSON и запись в stdout делает отдельный поток
+
+# контекст текущей игры/игрока, попадает во все записи, сделанные внутри задачи
+log_context: ContextVar[Dict] = ContextVar("log_context", default={})
+
+def bind_log_context(**fields):
+    log_context.set({**log_context.get(), **fields})
+
+# стандартные поля LogRecord, все остальное (extra=...) пишу в JSON как есть
+RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+class ContextFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        for key, value in log_context.get().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        return True
+
+# пропускаю только долю записей от шумных логгеров (sql, ходы), предупреждения и ошибки не сэмплирую
+class SamplingFilter(logging.Filter):
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self.rate_by_logger: Dict[str, Optional[float]] = {}
+
+    def rate_for(self, name: str) -> Optional[float]:
+        if name not in self.rate_by_logger:
+            # беру самое точное совпадение по иерархии логгеров: sqlalchemy.engine.Engine -> sqlalchemy.engine
+            rate = None
+            prefix = name
+            while prefix:
+                if prefix in self.rates:
+                    rate = self.rates[prefix]
+                    break
+                prefix = prefix.rpartition(".")[0]
+            self.rate_by_logger[name] = rate
+        return self.rate_by_logger[name]
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rate_for(record.name)
+        return rate is None or random.random() < rate
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in RESERVED_ATTRS:
+                data[key] = value
+        if record.exc_text:
+            data["exc"] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+# очередь ограничена: если поток записи не успевает, записи отбрасываются, а не тормозят обработчики
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    dropped = 0
+
+    # в потоке обработчика только подставляю аргументы в сообщение и сохраняю текст исключения,
+    # JSON собирается уже в потоке записи
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            NonBlockingQueueHandler.dropped += 1
+
+listener: Optional[logging.handlers.QueueListener] = None
+
+def setup_logging():
+    global listener
+    if listener is not None:
+        return
+
+    output = logging.StreamHandler(sys.stdout)
+    if settings.LOG_JSON:
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+    log_queue: queue.Queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(settings.LOG_SAMPLING))
+    queue_handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(settings.LOG_LEVEL.upper())
+    for name, level in settings.LOG_LEVELS.items():
+        logging.getLogger(name).setLevel(level.upper())
+
+    # логи uvicorn тоже отправляю через очередь
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers = []
+        uvicorn_logger.propagate = True
+
+    listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    listener.start()
+
+# дописываю оставшиеся записи при остановке
+def shutdown_logging():
+    global listener
+    if listener is not None:
+        listener.stop()
+        listener = None
@@ -1,8 +1,24 @@
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+import asyncio
+import logging
+import time
 
-from app.db_connect.db import engine
-from app.db_models.base import Base
-from app.api import players, games, websocket
+# отсчет времени до готовности начинаю с импорта приложения
+PROCESS_STARTED_AT = time.perf_counter()
+
+from app.logger import setup_logging, shutdown_logging
+from app.db_connect.db import warm_up_pool
+from app.db_connect.migrations import get_schema_version, LATEST_VERSION
+from app.api import players, games, websocket, admin
+from app.schemas import games as games_schemas, players as players_schemas
+from app.services.game_service import board_pool
+from app.services.reaper_service import ReaperService
+from app.services.cache_service import response_cache
+
+setup_logging()
+logger = logging.getLogger("app")
 
 app = FastAPI(title="Warship API")
 
@@ -10,15 +26,74 @@ app = FastAPI(title="Warship API")
 app.include_router(players.router)
 app.include_router(games.router)
 app.include_router(websocket.router)
+app.include_router(admin.router)
+
+app.add_middleware(admin.ProfilerMiddleware)
+app.add_middleware(admin.QueryStatsMiddleware)
+
+app.state.ready = False
+app.state.time_to_ready_ms = None
+
+# прогрев воркера: схема бд, пул соединений, пул досок, pydantic модели
+# пока он не закончен, /ready отвечает 503 и балансировщик не шлет сюда трафик
+async def warm_up_steps():
+    await warm_up_pool()
+
+    # заполняю пул досок в отдельном потоке
+    await asyncio.to_thread(board_pool.fill)
+
+    # строю схемы pydantic моделей и openapi заранее, а не на первом запросе
+    for module in (games_schemas, players_schemas):
+        for model in vars(module).values():
+            if isinstance(model, type) and issubclass(model, BaseModel) and model is not BaseModel:
+                model.model_json_schema()
+    app.openapi()
+
+# любой упавший шаг логируется и весь прогрев повторяется, иначе воркер навсегда остался бы неготовым
+async def warm_up():
+    while True:
+        try:
+            # миграции запускаются отдельно (python -m app.db_connect.migrations), здесь только жду их
+            schema_version = await get_schema_version()
+            if schema_version >= LATEST_VERSION:
+                await warm_up_steps()
+                break
+            logger.info("Схема бд версии %d, ожидаю миграцию до %d", schema_version, LATEST_VERSION)
+        except Exception as e:
+            logger.warning("Прогрев воркера не удался, повторяю: %s", e, exc_info=True)
+        await asyncio.sleep(1)
+
+    app.state.time_to_ready_ms = (time.perf_counter() - PROCESS_STARTED_AT) * 1000
+    app.state.ready = True
+    logger.info(
+        "Воркер готов за %.0f мс", app.state.time_to_ready_ms,
+        extra={"time_to_ready_ms": app.state.time_to_ready_ms}
+    )
 
-# lalala
-# подключение к бд
 @app.on_event("startup")
 async def startup_event():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-    print("Подключение прошло успешно")
+    app.state.warm_up_task = asyncio.create_task(warm_up())
+
+    # запускаю фоновую очистку зависших игр и статусов
+    app.state.reaper_task = asyncio.create_task(ReaperService.run_forever(websocket.manager))
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    app.state.warm_up_task.cancel()
+    app.state.reaper_task.cancel()
+    shutdown_logging()
 
 @app.get("/")
 async def home_page():
-    return {"message": "Игра морской бой"}
\ No newline at end of file
+    return {"message": "Игра морской бой"}
+
+# эндпоинт для метрик кеша ответов
+@app.get("/cache/metrics")
+async def get_cache_metrics():
+    return response_cache.metrics()
+
+# эндпоинт готовности воркера принимать трафик
+@app.get("/ready")
+async def readiness():
+    body = {"ready": app.state.ready, "time_to_ready_ms": app.state.time_to_ready_ms}
+    return JSONResponse(body, status_code=200 if app.state.ready else 503)
@@ -0,0 +1,23 @@
+from pydantic import BaseModel, Field
+from datetime import datetime
+from typing import List, Literal
+
+class ProfilerConfig(BaseModel):
+    enabled: bool = False
+    # sample - периодические снимки стека (collapsed stacks для флеймграфа), cprofile - .prof файл
+    mode: Literal["sample", "cprofile"] = "sample"
+    # доля случайно профилируемых обработчиков
+    sample_rate: float = Field(0.0, ge=0.0, le=1.0)
+    # игры, все ходы которых профилируются
+    game_ids: List[int] = []
+    # профилировать запрос, если в нем есть заголовок X-Profile
+    allow_request_header: bool = True
+    # сохраняю только обработчики медленнее порога
+    threshold_ms: float = Field(100.0, ge=0.0)
+
+class ProfileInfo(BaseModel):
+    id: int
+    name: str
+    mode: str
+    duration_ms: float
+    created_at: datetime
@@ -1,5 +1,6 @@
 from pydantic import BaseModel, ConfigDict
 from datetime import datetime
+from typing import Optional
 
 class GameCreate(BaseModel):
     player_1_id: int
@@ -25,4 +26,11 @@ class GameWithPlayerLogins(BaseModel):
     p_1_res: int
     p_2_res: int
     online: bool
-    start_date: datetime
\ No newline at end of file
+    start_date: datetime
+
+class GameBulkResult(BaseModel):
+    index: int
+    player_1_id: int
+    player_2_id: int
+    game_id: Optional[int] = None
+    detail: Optional[str] = None
@@ -1,4 +1,5 @@
 from pydantic import BaseModel, Field, ConfigDict
+from typing import Optional
 
 class PlayerCreate(BaseModel):
     login: str = Field(..., min_length=3, max_length=20)
@@ -22,3 +23,9 @@ class PlayerStats(BaseModel):
     total_games: int = 0
     wins: int = 0
     losses: int = 0
+
+class PlayerBulkResult(BaseModel):
+    index: int
+    login: str
+    id: Optional[int] = None
+    detail: Optional[str] = None
@@ -0,0 +1,72 @@
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from app.db_connect.db import settings
+
+# кеш готовых ответов списков и статистики: ttl + вытеснение давно не используемых (LRU)
+# кеш локален для воркера, поэтому ttl держу коротким: другие воркеры узнают об изменениях не позже чем через ttl
+class ResponseCache:
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # ключ -> (истекает в, тело ответа, etag)
+        self.entries: "OrderedDict[str, Tuple[float, bytes, str]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.not_modified = 0
+
+    def get(self, key: str) -> Optional[Tuple[bytes, str]]:
+        entry = self.entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self.entries[key]
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1], entry[2]
+
+    def set(self, key: str, body: bytes, etag: str):
+        self.entries[key] = (time.monotonic() + self.ttl, body, etag)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    # сброс вызывается из мест, где меняются данные
+    def invalidate(self, key: str):
+        self.entries.pop(key, None)
+
+    def invalidate_prefix(self, prefix: str):
+        for key in [key for key in self.entries if key.startswith(prefix)]:
+            del self.entries[key]
+
+    def metrics(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "not_modified": self.not_modified,
+        }
+
+response_cache = ResponseCache(settings.RESPONSE_CACHE_TTL_SECONDS, settings.RESPONSE_CACHE_MAX_ENTRIES)
+
+# ключи кеша
+ACTIVE_GAMES_KEY = "games:active"
+AVAILABLE_PLAYERS_KEY = "players:available"
+PLAYER_STATS_PREFIX = "players:stats:"
+
+def player_stats_key(player_id: int) -> str:
+    return f"{PLAYER_STATS_PREFIX}{player_id}"
+
+# игра создана или завершена: меняются список игр, свободные игроки и статистика участников
+def invalidate_game_caches(*player_ids: int):
+    response_cache.invalidate(ACTIVE_GAMES_KEY)
+    response_cache.invalidate(AVAILABLE_PLAYERS_KEY)
+    for player_id in player_ids:
+        response_cache.invalidate(player_stats_key(player_id))
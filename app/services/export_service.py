@@ -0,0 +1,85 @@
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from typing import AsyncIterator, Optional, Sequence
+
+from app.db_connect.db import AsyncSessionLocal, settings
+from app.services.game_service import GameService
+
+# выгрузка истории завершенных игр потоком: строки читаются серверным курсором и сразу отдаются клиенту,
+# в памяти держится только одна пачка строк
+
+CSV_HEADER = (
+    "id", "player_1_id", "player_2_id", "p_1_res", "p_2_res",
+    "start_date", "finished_at", "board_player_1", "board_player_2"
+)
+
+def format_date(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value is not None else None
+
+# finished_at - last_activity завершенной игры, при завершении (ход, сдача, очистка) оно обновляется
+# доски уже лежат в бд как JSON, вставляю их в строку без повторного разбора
+def encode_ndjson(rows: Sequence) -> bytes:
+    lines = []
+    for row in rows:
+        meta = json.dumps({
+            "id": row.id,
+            "player_1_id": row.player_1_id,
+            "player_2_id": row.player_2_id,
+            "p_1_res": row.p_1_res,
+            "p_2_res": row.p_2_res,
+            "start_date": format_date(row.start_date),
+            "finished_at": format_date(row.last_activity),
+        })
+        lines.append(
+            f'{meta[:-1]}, "board_player_1": {row.board_player_1 or "null"}, '
+            f'"board_player_2": {row.board_player_2 or "null"}}}\n'
+        )
+    return "".join(lines).encode()
+
+def encode_csv(rows: Sequence) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow((
+            row.id, row.player_1_id, row.player_2_id, row.p_1_res, row.p_2_res,
+            format_date(row.start_date), format_date(row.last_activity),
+            row.board_player_1, row.board_player_2
+        ))
+    return buffer.getvalue().encode()
+
+def csv_header() -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(CSV_HEADER)
+    return buffer.getvalue().encode()
+
+class ExportService:
+
+    @staticmethod
+    async def export_games(
+        export_format: str,
+        player_id: Optional[int] = None,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None
+    ) -> AsyncIterator[bytes]:
+        # сессия своя: сессия из get_db закрывается до того, как ответ начнет отправляться
+        encode = encode_csv if export_format == "csv" else encode_ndjson
+        if export_format == "csv":
+            yield csv_header()
+        async with AsyncSessionLocal() as db:
+            async for rows in GameService.stream_finished_games(
+                db, player_id, date_from, date_to, settings.EXPORT_BATCH_SIZE
+            ):
+                yield encode(rows)
+
+    # сжимаю на лету: gzip поток собирается из кусков, весь файл в памяти не появляется
+    @staticmethod
+    async def gzip_chunks(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        async for chunk in chunks:
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
@@ -0,0 +1,126 @@
+import random
+from typing import List
+
+# правила игры без бд и ввода-вывода, их используют GameService и симулятор
+# натсройки игры, упрощенная версия морского боя: 3 корабля длиной в 3 клетки
+BOARD_SIZE = 10
+NUM_SHIPS = 3
+SHIP_LENGTH = 3
+
+# значения клеток: 0 - пусто, 1 - корабль, 2 - попадание, 3 - промах
+EMPTY = 0
+SHIP = 1
+HIT = 2
+MISS = 3
+
+# результаты выстрела
+SHOT_MISS = "miss"
+SHOT_HIT = "hit"
+SHOT_SUNK = "sunk"
+SHOT_ALL_SUNK = "all_sunk"
+SHOT_REPEAT_HIT = "repeat_hit"
+SHOT_REPEAT_MISS = "repeat_miss"
+
+def generate_board(rng: random.Random = random) -> List[List[int]]:
+    # генерирую доски для игры, 0 - поустая клетка, 1 - корабль
+    board = [[EMPTY for _ in range(BOARD_SIZE)] for _ in range(BOARD_SIZE)]
+    placed_ships_cells = []
+
+    attempts = 0
+    max_attempts = 1000
+
+    # логика рандомного расположения корабля по правилам игры
+    while len(placed_ships_cells) < NUM_SHIPS * SHIP_LENGTH and attempts < max_attempts:
+        # выбор ориентации: горизонтальная или вертикальная
+        orientation = rng.choice(['horizontal', 'vertical'])
+
+        if orientation == 'horizontal':
+            row = rng.randint(0, BOARD_SIZE - 1)
+            col = rng.randint(0, BOARD_SIZE - SHIP_LENGTH)
+            potential_cells = [(row, col + i) for i in range(SHIP_LENGTH)]
+        else:
+            row = rng.randint(0, BOARD_SIZE - SHIP_LENGTH)
+            col = rng.randint(0, BOARD_SIZE - 1)
+            potential_cells = [(row + i, col) for i in range(SHIP_LENGTH)]
+
+        # Проверяю, заняты ли клетки
+        collision = False
+        for r, c in potential_cells:
+            if board[r][c] == SHIP:
+                collision = True
+                break
+            # проверяю соседние клетки
+            for dr in [-1, 0, 1]:
+                for dc in [-1, 0, 1]:
+                    nr, nc = r + dr, c + dc
+                    if (0 <= nr < BOARD_SIZE and 0 <= nc < BOARD_SIZE and
+                        board[nr][nc] == SHIP and (nr, nc) not in potential_cells):
+                        collision = True
+                        break
+                if collision: break
+            if collision: break
+
+        if not collision:
+            for r, c in potential_cells:
+                board[r][c] = SHIP
+                placed_ships_cells.append((r, c))
+        attempts += 1
+
+    if len(placed_ships_cells) < NUM_SHIPS * SHIP_LENGTH:
+        # если не удалось разместить все корабли после max_attempts
+        raise RuntimeError("Не удалось разместить все корабли")
+
+    return board
+
+# выстрел по доске, доска меняется на месте
+# координаты должны быть уже проверены на попадание в границы доски
+def fire(board: List[List[int]], row: int, col: int) -> str:
+    cell_value = board[row][col]
+    if cell_value == HIT:
+        return SHOT_REPEAT_HIT
+    if cell_value == MISS:
+        return SHOT_REPEAT_MISS
+
+    if cell_value == SHIP:
+        board[row][col] = HIT
+        if not is_ship_sunk(board, row, col):
+            return SHOT_HIT
+        if are_all_ships_sunk(board):
+            return SHOT_ALL_SUNK
+        return SHOT_SUNK
+
+    board[row][col] = MISS
+    return SHOT_MISS
+
+# функция для проверки, потоплен ли корабль
+def is_ship_sunk(board: List[List[int]], row: int, col: int) -> bool:
+    # перепроверяю, что в клетке было попадание
+    if board[row][col] != HIT:
+        return False
+
+    # для того, чтобы понять, потоплен ли корабль, я проверяю соседние клетки, чтобы найти остальные части от этого корабля
+    # если хотя бы одна часть корабля еще цела, то корабль не потоплен
+    stack = [(row, col)]
+    visited = {(row, col)}
+
+    while stack:
+        r, c = stack.pop()
+        if board[r][c] == SHIP:
+            return False
+
+        # просматриваю только гориз. и верт. соседние клетки
+        for nr, nc in ((r - 1, c), (r + 1, c), (r, c - 1), (r, c + 1)):
+            if 0 <= nr < BOARD_SIZE and 0 <= nc < BOARD_SIZE:
+                if (nr, nc) not in visited and board[nr][nc] in (SHIP, HIT):
+                    visited.add((nr, nc))
+                    stack.append((nr, nc))
+
+    return True
+
+# функция для првоерки, все ли корабли потоплены
+def are_all_ships_sunk(board: List[List[int]]) -> bool:
+    # если есть хотя бы одна целая часть корабля
+    for board_row in board:
+        if SHIP in board_row:
+            return False
+    return True
@@ -1,77 +1,35 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-import random
+from sqlalchemy import update, insert, Row
+from sqlalchemy.orm import aliased
+from sqlalchemy.exc import DBAPIError
+import asyncio
 import json
+from collections import deque
 from datetime import datetime
-from typing import List, Optional, Tuple
+from typing import AsyncIterator, Deque, Dict, List, Optional, Sequence, Tuple
 
+from app.db_connect.db import settings
 from app.db_models.players import PlayersORM
 from app.db_models.games import GamesORM
-from app.schemas.games import GameWithPlayerLogins
+from app.schemas.games import GameCreate, GameWithPlayerLogins, GameBulkResult
 from app.services.player_service import PlayerService
+from app.services.cache_service import response_cache, invalidate_game_caches, PLAYER_STATS_PREFIX
+from app.services import game_rules
+from app.services.game_rules import BOARD_SIZE
 
-# натсройки игры, упрощенная версия морского боя: 3 корабля длиной в 3 клетки
-BOARD_SIZE = 10
-NUM_SHIPS = 3
-SHIP_LENGTH = 3
+# сколько строк вставлять одним insert при массовом создании
+BULK_INSERT_CHUNK_SIZE = 1000
+# сколько раз повторять ход, если игру успели изменить между чтением и update
+MOVE_MAX_RETRIES = 3
+MOVE_EXECUTION_OPTIONS = {"isolation_level": "AUTOCOMMIT"}
 
 class GameService:
 
     @staticmethod
     def generate_random_board() -> str:
-        # генерирую доски для игры, 0 - поустая клетка, 1 - корабль
-        board = [[0 for _ in range(BOARD_SIZE)] for _ in range(BOARD_SIZE)]
-        placed_ships_cells = []
-
-        attempts = 0
-        max_attempts = 1000
-
-        # логика рандомного расположения корабля по правилам игры
-        while len(placed_ships_cells) < NUM_SHIPS * SHIP_LENGTH and attempts < max_attempts:
-            ship_cells = []
-
-            # выбор ориентации: горизонтальная или вертикальная
-            orientation = random.choice(['horizontal', 'vertical'])
-
-            if orientation == 'horizontal':
-                row = random.randint(0, BOARD_SIZE - 1)
-                col = random.randint(0, BOARD_SIZE - SHIP_LENGTH)
-                potential_cells = [(row, col + i) for i in range(SHIP_LENGTH)]
-            else:
-                row = random.randint(0, BOARD_SIZE - SHIP_LENGTH)
-                col = random.randint(0, BOARD_SIZE - 1)
-                potential_cells = [(row + i, col) for i in range(SHIP_LENGTH)]
-
-            # Проверяю, заняты ли клетки
-            collision = False
-            for r, c in potential_cells:
-                if board[r][c] == 1:
-                    collision = True
-                    break
-                # проверяю соседние клетки
-                for dr in [-1, 0, 1]:
-                    for dc in [-1, 0, 1]:
-                        nr, nc = r + dr, c + dc
-                        if (0 <= nr < BOARD_SIZE and 0 <= nc < BOARD_SIZE and
-                            board[nr][nc] == 1 and (nr, nc) not in potential_cells):
-                            collision = True
-                            break
-                    if collision: break
-                if collision: break
-
-            if not collision:
-                for r, c in potential_cells:
-                    board[r][c] = 1
-                    placed_ships_cells.append((r, c))
-            attempts += 1
-
-        if len(placed_ships_cells) < NUM_SHIPS * SHIP_LENGTH:
-            # если не удалось разместить все корабли после max_attempts
-            raise RuntimeError("Не удалось разместить все корабли")
-
-
         # возвращаю доску как JSON строку
-        return json.dumps(board)
+        return json.dumps(game_rules.generate_board())
 
     @staticmethod
     async def create_game(db: AsyncSession, player1_id: int, player2_id: int) -> Optional[GamesORM]:
@@ -94,10 +52,9 @@ class GameService:
         db.add(player1)
         db.add(player2)
 
-        # генерирую доски
+        # беру доски из заранее сгенерированного пула
         try:
-            board1_json = GameService.generate_random_board()
-            board2_json = GameService.generate_random_board()
+            board1_json, board2_json = await board_pool.take(2)
         except RuntimeError as e:
             # если генерация доски не удалась, снова меняю статусов и возвращаю None
             player1.status = 0
@@ -105,13 +62,15 @@ class GameService:
             await db.commit()
             return None
 
+        now = datetime.utcnow()
         new_game = GamesORM(
             player_1_id=player1_id,
             player_2_id=player2_id,
             p_1_res=0,
             p_2_res=0,
             online=True,
-            start_date=datetime.utcnow(),
+            start_date=now,
+            last_activity=now,
             board_player_1=board1_json,
             board_player_2=board2_json,
             current_turn_player_id=player1_id
@@ -120,8 +79,110 @@ class GameService:
         db.add(new_game)
         await db.commit()
         await db.refresh(new_game)
+        invalidate_game_caches(player1_id, player2_id)
+        board_pool.schedule_refill()
         return new_game
 
+    @staticmethod
+    async def create_games_bulk(db: AsyncSession, pairings: List[GameCreate]) -> List[GameBulkResult]:
+        results: List[Optional[GameBulkResult]] = [None] * len(pairings)
+
+        def fail(index: int, detail: str):
+            pairing = pairings[index]
+            results[index] = GameBulkResult(
+                index=index, player_1_id=pairing.player_1_id, player_2_id=pairing.player_2_id, detail=detail
+            )
+
+        # проверки внутри самого запроса, без бд
+        requested_ids = set()
+        candidates = []
+        for index, pairing in enumerate(pairings):
+            if pairing.player_1_id == pairing.player_2_id:
+                fail(index, "Игроки не могут быть одни и те же")
+            elif pairing.player_1_id in requested_ids or pairing.player_2_id in requested_ids:
+                fail(index, "Игрок уже участвует в другой паре этого запроса")
+            else:
+                requested_ids.update((pairing.player_1_id, pairing.player_2_id))
+                candidates.append(index)
+
+        if not candidates:
+            return results
+
+        # одним запросом занимаю всех свободных игроков, занятые и несуществующие не вернутся
+        stmt_claim = (
+            update(PlayersORM)
+            .where(PlayersORM.id.in_(requested_ids), PlayersORM.status == 0)
+            .values(status=1)
+            .returning(PlayersORM.id)
+            .execution_options(synchronize_session=False)
+        )
+        claimed_ids = set((await db.execute(stmt_claim)).scalars())
+
+        valid = []
+        partially_claimed = []
+        for index in candidates:
+            pairing = pairings[index]
+            pair_claimed = [pid for pid in (pairing.player_1_id, pairing.player_2_id) if pid in claimed_ids]
+            if len(pair_claimed) == 2:
+                valid.append(index)
+            else:
+                partially_claimed.extend(pair_claimed)
+                fail(index, "Один или оба игрока не найдены или уже играют")
+
+        # возвращаю статус игрокам из пар, которые не получилось создать
+        if partially_claimed:
+            await db.execute(
+                update(PlayersORM)
+                .where(PlayersORM.id.in_(partially_claimed))
+                .values(status=0)
+                .execution_options(synchronize_session=False)
+            )
+
+        if valid:
+            boards = await board_pool.take(2 * len(valid))
+            now = datetime.utcnow()
+            rows = [
+                {
+                    "player_1_id": pairings[index].player_1_id,
+                    "player_2_id": pairings[index].player_2_id,
+                    "p_1_res": 0,
+                    "p_2_res": 0,
+                    "online": True,
+                    "start_date": now,
+                    "last_activity": now,
+                    "board_player_1": boards[2 * i],
+                    "board_player_2": boards[2 * i + 1],
+                    "current_turn_player_id": pairings[index].player_1_id,
+                }
+                for i, index in enumerate(valid)
+            ]
+            # многострочный insert кусками (у postgres ограничение на число параметров в запросе),
+            # игры сопоставляю по player_1_id (он уникален в пределах запроса)
+            game_ids = {}
+            for start in range(0, len(rows), BULK_INSERT_CHUNK_SIZE):
+                stmt_insert = (
+                    insert(GamesORM)
+                    .values(rows[start:start + BULK_INSERT_CHUNK_SIZE])
+                    .returning(GamesORM.id, GamesORM.player_1_id)
+                )
+                for game_id, player_1_id in (await db.execute(stmt_insert)).all():
+                    game_ids[player_1_id] = game_id
+
+            for index in valid:
+                pairing = pairings[index]
+                results[index] = GameBulkResult(
+                    index=index,
+                    player_1_id=pairing.player_1_id,
+                    player_2_id=pairing.player_2_id,
+                    game_id=game_ids[pairing.player_1_id]
+                )
+
+        await db.commit()
+        invalidate_game_caches()
+        response_cache.invalidate_prefix(PLAYER_STATS_PREFIX)
+        board_pool.schedule_refill()
+        return results
+
     @staticmethod
     async def get_active_games(db: AsyncSession) -> List[GameWithPlayerLogins]:
         # получаю все активные игры
@@ -161,6 +222,41 @@ class GameService:
 
         return games_with_logins
 
+    # колонки выгрузки истории игр
+    EXPORT_COLUMNS = (
+        GamesORM.id,
+        GamesORM.player_1_id,
+        GamesORM.player_2_id,
+        GamesORM.p_1_res,
+        GamesORM.p_2_res,
+        GamesORM.start_date,
+        GamesORM.last_activity,
+        GamesORM.board_player_1,
+        GamesORM.board_player_2,
+    )
+
+    @staticmethod
+    async def stream_finished_games(
+        db: AsyncSession,
+        player_id: Optional[int] = None,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+        batch_size: int = 1000
+    ) -> AsyncIterator[Sequence]:
+        # завершенные игры читаю серверным курсором пачками по batch_size строк, память не зависит от числа игр
+        stmt = select(*GameService.EXPORT_COLUMNS).where(GamesORM.online == False)
+        if player_id is not None:
+            stmt = stmt.where((GamesORM.player_1_id == player_id) | (GamesORM.player_2_id == player_id))
+        if date_from is not None:
+            stmt = stmt.where(GamesORM.start_date >= date_from)
+        if date_to is not None:
+            stmt = stmt.where(GamesORM.start_date < date_to)
+        stmt = stmt.order_by(GamesORM.id).execution_options(yield_per=batch_size)
+
+        result = await db.stream(stmt)
+        async for partition in result.partitions():
+            yield partition
+
     @staticmethod
     async def get_game_by_id(db: AsyncSession, game_id: int) -> Optional[GamesORM]:
         return await db.get(GamesORM, game_id)
@@ -170,172 +266,215 @@ class GameService:
         game = await db.get(GamesORM, game_id)
         if game:
             game.online = is_online
+            game.last_activity = datetime.utcnow()
             await db.commit()
             await db.refresh(game)
+            invalidate_game_caches(game.player_1_id, game.player_2_id)
             return game
         return None
 
-    @staticmethod
-    async def process_player_move(
-        db: AsyncSession,
-        game_id: int,
-        player_id: int,
-        target_row: int,
-        target_col: int
-    ) -> Tuple[str, Optional[str], Optional[str]]:
-
-        game = await GameService.get_game_by_id(db, game_id)
-        if not game or not game.online:
-            return "Игра не найдена или завершена", None, None
+    # колонки состояния игры, нужные для хода, их же возвращает update хода
+    MOVE_STATE_COLUMNS = (
+        GamesORM.id,
+        GamesORM.player_1_id,
+        GamesORM.player_2_id,
+        GamesORM.p_1_res,
+        GamesORM.p_2_res,
+        GamesORM.online,
+        GamesORM.board_player_1,
+        GamesORM.board_player_2,
+        GamesORM.current_turn_player_id,
+        GamesORM.version,
+    )
 
-        player1 = await db.get(PlayersORM, game.player_1_id)
-        player2 = await db.get(PlayersORM, game.player_2_id)
+    @staticmethod
+    async def get_move_state(db: AsyncSession, game_id: int) -> Optional[Row]:
+        result = await db.execute(select(*GameService.MOVE_STATE_COLUMNS).where(GamesORM.id == game_id))
+        return result.first()
 
-        if not player1 or not player2:
-            return "Ошибка: один из игроков не найден", None, None
+    # состояние игры вместе с логинами участников одним запросом (для подключения к игре)
+    # логин будет None, если игрока нет
+    @staticmethod
+    async def get_move_state_with_logins(db: AsyncSession, game_id: int) -> Optional[Row]:
+        player1 = aliased(PlayersORM)
+        player2 = aliased(PlayersORM)
+        stmt = (
+            select(
+                *GameService.MOVE_STATE_COLUMNS,
+                player1.login.label("player_1_login"),
+                player2.login.label("player_2_login")
+            )
+            .outerjoin(player1, player1.id == GamesORM.player_1_id)
+            .outerjoin(player2, player2.id == GamesORM.player_2_id)
+            .where(GamesORM.id == game_id)
+        )
+        result = await db.execute(stmt)
+        return result.first()
 
-        if player_id == game.player_1_id:
-            is_player1_turn = True
-            my_board_json = game.board_player_1
-            target_board_json = game.board_player_2
+    # проверяю ход по состоянию игры и считаю, какие колонки он меняет, без обращения к бд
+    @staticmethod
+    def apply_shot(state, player_id: int, target_row: int, target_col: int) -> Tuple[str, Optional[Dict]]:
+        if player_id == state.player_1_id:
+            target_board_json = state.board_player_2
+            target_board_attr = 'board_player_2'
             my_res_attr = 'p_1_res'
             opponent_res_attr = 'p_2_res'
-        elif player_id == game.player_2_id:
-            is_player1_turn = False
-            my_board_json = game.board_player_2
-            target_board_json = game.board_player_1
+            opponent_id = state.player_2_id
+        elif player_id == state.player_2_id:
+            target_board_json = state.board_player_1
+            target_board_attr = 'board_player_1'
             my_res_attr = 'p_2_res'
             opponent_res_attr = 'p_1_res'
-
-        # проверяю чей сейчас ход
-        current_player_moved_id = player_id
-
-        if game.player_1_id == current_player_moved_id:
-            game.current_turn_player_id = game.player_2_id
+            opponent_id = state.player_1_id
         else:
-            game.current_turn_player_id = game.player_1_id
+            return "Вы не участник этой игры", None
 
-        if player_id != game.current_turn_player_id:
-            return "Сейчас не ваш ход!", None, None
+        # проверяю чей сейчас ход
+        if state.current_turn_player_id != player_id:
+            return "Сейчас не ваш ход!", None
 
         # получаю JSON доску
         try:
-            my_board = json.loads(my_board_json)
             target_board = json.loads(target_board_json)
         except (json.JSONDecodeError, TypeError):
-            return "Ошибка получения доски", None, None
+            return "Ошибка получения доски", None
 
         # проверяю, что ход сделан по правильным координатам
         if not (0 <= target_row < BOARD_SIZE and 0 <= target_col < BOARD_SIZE):
-            return "Некорректные координаты выстрела.", None, None
-
-        # проверяю, в свободную ли клетку выстрелил игрок
-        # 0 - пусто (промах), 1 - корабль (попадание), 2 - повторное попадание, 3 повторный промах - промах
-        cell_value = target_board[target_row][target_col]
-        if cell_value == 2:
-            return "В эту клетку уже было попадание", None, None
-        if cell_value == 3:
-            return "В эту клетку уже был промах", None, None
+            return "Некорректные координаты выстрела.", None
 
         # обработка выстрела
-        result_message = ""
-        is_hit = False
-        is_sunk = False
-        all_ships_sunk = False
-
-        # отмечаю попадание по кораблю
-        if cell_value == 1:
-            target_board[target_row][target_col] = 2
-            result_message = "Попадание"
-            is_hit = True
+        # 0 - пусто (промах), 1 - корабль (попадание), 2 - повторное попадание, 3 повторный промах - промах
+        shot = game_rules.fire(target_board, target_row, target_col)
+        if shot == game_rules.SHOT_REPEAT_HIT:
+            return "В эту клетку уже было попадание", None
+        if shot == game_rules.SHOT_REPEAT_MISS:
+            return "В эту клетку уже был промах", None
 
-            # проверяю, потоплен ли корабль
-            if GameService.is_ship_sunk(target_board, target_row, target_col):
-                result_message += " Корабль потоплен"
-                is_sunk = True
-
-                # проверяем окончание игры
-                if GameService.are_all_ships_sunk(target_board):
-                    result_message += " Все ваши корабли уничтожены"
-                    all_ships_sunk = True
-                    game.online = False
-                    # игрок, чей ход был посдедним, проиграл (его корабли потоплены)
-                    setattr(game, my_res_attr, 0)
-                    setattr(game, opponent_res_attr, 1)
-                    # обновляю статусы игроков
-                    player1.status = 0
-                    player2.status = 0
-                    db.add(player1)
-                    db.add(player2)
-        # промах по кораблю
-        else:
-            target_board[target_row][target_col] = 3
+        if shot == game_rules.SHOT_MISS:
             result_message = "Промах"
-
-        # обновляю доски в базе данных
-        if is_player1_turn:
-            game.board_player_1 = json.dumps(my_board)
-            game.board_player_2 = json.dumps(target_board)
         else:
-            game.board_player_2 = json.dumps(my_board)
-            game.board_player_1 = json.dumps(target_board)
-
-        await db.commit()
-        await db.refresh(game)
+            result_message = "Попадание"
+            if shot in (game_rules.SHOT_SUNK, game_rules.SHOT_ALL_SUNK):
+                result_message += " Корабль потоплен"
 
-        # обновляю статистику игроков, если игра завершена
-        if all_ships_sunk:
-            await PlayerService.update_player_stats(db, game, player1.id)
-            await PlayerService.update_player_stats(db, game, player2.id)
+        # меняется только доска соперника и очередь хода
+        values = {target_board_attr: json.dumps(target_board), "current_turn_player_id": opponent_id}
 
-        # возвращаю JSON доски для отображения на клиенте
-        return result_message, json.dumps(my_board), json.dumps(target_board)
+        # проверяем окончание игры
+        if shot == game_rules.SHOT_ALL_SUNK:
+            result_message += " Все ваши корабли уничтожены"
+            values["online"] = False
+            # игрок, чей ход был посдедним, проиграл (его корабли потоплены)
+            values[my_res_attr] = 0
+            values[opponent_res_attr] = 1
 
+        return result_message, values
 
-    # функция для проверки, потоплен ли корабль
+    # ход - один условный update по версии игры: state это последнее известное воркеру состояние игры
+    # (из памяти или из прошлого хода), если его успели изменить, update не найдет строку, тогда перечитываю игру
     @staticmethod
-    def is_ship_sunk(board: List[List[int]], row: int, col: int) -> bool:
-        # перепроверяю, что в клетке было попадание
-        if board[row][col] != 2:
-            return False
-
-        # для того, чтобы понять, потоплен ли корабль, я проверяю соседние клетки, чтобы найти остальные части от этого корабля
-        # если остальные части тоже были подбиты, то корабль потоплен
-        q = [(row, col)]
-        visited = set([(row, col)])
-        ship_cells_found = []
-
-        while q:
-            r, c = q.pop(0)
-
-            # добавляю текущую клетку, если она является частью корабля
-            if board[r][c] in [1, 2]:
-                ship_cells_found.append((r, c))
-
-            # просматриваю соседние клетки
-            for dr in [-1, 0, 1]:
-                for dc in [-1, 0, 1]:
-                    # проверяю только гориз. и верт. клетки
-                    if abs(dr) + abs(dc) == 1:
-                        nr, nc = r + dr, c + dc
-                        if 0 <= nr < BOARD_SIZE and 0 <= nc < BOARD_SIZE:
-                            if (nr, nc) not in visited and board[nr][nc] in [1, 2]:
-                                visited.add((nr, nc))
-                                q.append((nr, nc))
-
-        # проверяею, есть ли в найденных клетках значение 1
-        for r, c in ship_cells_found:
-            if board[r][c] == 1:
-                return False
-
-        return True
-
-    # функция для првоерки, все ли корабли потоплены
+    async def process_player_move(
+        db: AsyncSession,
+        game_id: int,
+        player_id: int,
+        target_row: int,
+        target_col: int,
+        state=None
+    ) -> Tuple[str, Optional[str], Optional[str], Optional[Row]]:
+        # одиночный update атомарен сам по себе, в autocommit не тратятся лишние BEGIN/COMMIT
+        await db.connection(execution_options=MOVE_EXECUTION_OPTIONS)
+
+        for _ in range(MOVE_MAX_RETRIES):
+            is_fresh = state is None
+            new_state = None
+            try:
+                if is_fresh:
+                    state = await GameService.get_move_state(db, game_id)
+                if state is None or not state.online:
+                    message, values = "Игра не найдена или завершена", None
+                else:
+                    message, values = GameService.apply_shot(state, player_id, target_row, target_col)
+
+                if values is not None:
+                    values["version"] = GamesORM.version + 1
+                    values["last_activity"] = datetime.utcnow()
+                    result = await db.execute(
+                        update(GamesORM)
+                        .where(GamesORM.id == game_id, GamesORM.version == state.version)
+                        .values(**values)
+                        .returning(*GameService.MOVE_STATE_COLUMNS)
+                        .execution_options(synchronize_session=False)
+                    )
+                    new_state = result.first()
+            except DBAPIError as error:
+                # pool_pre_ping выключен, чтобы ход был одним обращением к бд, поэтому соединение из пула
+                # может оказаться разорванным: беру новое и повторяю ход по свежему состоянию
+                if not error.connection_invalidated:
+                    raise
+                await db.rollback()
+                await db.connection(execution_options=MOVE_EXECUTION_OPTIONS)
+                state = None
+                continue
+
+            if values is None:
+                # ошибка могла получиться из-за устаревшего состояния (например, очередь хода), проверяю по бд
+                if not is_fresh:
+                    state = None
+                    continue
+                return message, None, None, state
+
+            if new_state is None:
+                # игру изменили параллельно (ход с другого воркера, сдача, очистка) - перечитываю и повторяю
+                state = None
+                continue
+
+            # записи игроков читаю только при окончании игры, чтобы обновить статистику
+            if not new_state.online:
+                invalidate_game_caches(new_state.player_1_id, new_state.player_2_id)
+                await PlayerService.update_player_stats(db, new_state, new_state.player_1_id)
+                await PlayerService.update_player_stats(db, new_state, new_state.player_2_id)
+
+            # возвращаю JSON доски для отображения на клиенте
+            if player_id == new_state.player_1_id:
+                return message, new_state.board_player_1, new_state.board_player_2, new_state
+            return message, new_state.board_player_2, new_state.board_player_1, new_state
+
+        return "Не удалось сделать ход, попробуйте еще раз", None, None, None
+
+
+# пул заранее сгенерированных досок, чтобы не генерировать их в момент создания игры
+class BoardPool:
+    def __init__(self, size: int):
+        self.size = size
+        self.boards: Deque[str] = deque()
+        self.refilling = False
+
+    def fill(self):
+        while len(self.boards) < self.size:
+            self.boards.append(GameService.generate_random_board())
+
     @staticmethod
-    def are_all_ships_sunk(board: List[List[int]]) -> bool:
-        for r in range(BOARD_SIZE):
-            for c in range(BOARD_SIZE):
-                # если есть хотя бы одна целая часть корабля
-                if board[r][c] == 1:
-                    return False
-        return True
+    def generate(count: int) -> List[str]:
+        return [GameService.generate_random_board() for _ in range(count)]
+
+    async def take(self, count: int) -> List[str]:
+        boards = []
+        while len(boards) < count and self.boards:
+            boards.append(self.boards.popleft())
+        # пул пуст, недостающие доски генерирую в потоке: при массовом создании их могут быть тысячи,
+        # на event loop это заблокировало бы все сокеты воркера
+        shortfall = count - len(boards)
+        if shortfall:
+            boards.extend(await asyncio.to_thread(BoardPool.generate, shortfall))
+        return boards
+
+    # дозаполняю пул в фоновом потоке, не блокируя event loop
+    def schedule_refill(self):
+        if self.refilling or len(self.boards) >= self.size:
+            return
+        self.refilling = True
+        future = asyncio.get_running_loop().run_in_executor(None, self.fill)
+        future.add_done_callback(lambda _: setattr(self, "refilling", False))
+
+board_pool = BoardPool(settings.BOARD_POOL_SIZE)
@@ -1,10 +1,14 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from sqlalchemy import update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from datetime import datetime
 from typing import List, Optional
 
 from app.db_models.players import PlayersORM
-from app.db_models.games import GamesORM
-from app.schemas.players import PlayerCreate, PlayerLogin, Player, PlayerStats
+from app.db_models.games import GamesORM, RESULT_ABANDONED
+from app.schemas.players import PlayerCreate, PlayerLogin, Player, PlayerStats, PlayerBulkResult
+from app.services.cache_service import response_cache, AVAILABLE_PLAYERS_KEY, player_stats_key
 
 class PlayerService:
     @staticmethod
@@ -26,8 +30,50 @@ class PlayerService:
         db.add(new_player_orm)
         await db.commit()
         await db.refresh(new_player_orm)
+        response_cache.invalidate(AVAILABLE_PLAYERS_KEY)
         return new_player_orm
 
+    @staticmethod
+    async def register_players_bulk(db: AsyncSession, players_data: List[PlayerCreate]) -> List[PlayerBulkResult]:
+        results: List[Optional[PlayerBulkResult]] = [None] * len(players_data)
+
+        # повторяющиеся логины внутри запроса
+        first_index = {}
+        for index, player_data in enumerate(players_data):
+            if player_data.login in first_index:
+                results[index] = PlayerBulkResult(index=index, login=player_data.login, detail="Логин повторяется в запросе")
+            else:
+                first_index[player_data.login] = index
+
+        # одним запросом проверяю, какие логины уже заняты
+        stmt_check = select(PlayersORM.login).where(PlayersORM.login.in_(first_index.keys()))
+        existing_logins = set((await db.execute(stmt_check)).scalars())
+
+        rows = [
+            {"login": login, "password": players_data[index].password, "stats": 0, "status": 0}
+            for login, index in first_index.items()
+            if login not in existing_logins
+        ]
+        created_ids = {}
+        if rows:
+            # многострочный insert, логины, занятые параллельным запросом, просто пропускаются
+            stmt_insert = (
+                pg_insert(PlayersORM)
+                .values(rows)
+                .on_conflict_do_nothing(index_elements=[PlayersORM.login])
+                .returning(PlayersORM.id, PlayersORM.login)
+            )
+            created_ids = {login: player_id for player_id, login in (await db.execute(stmt_insert)).all()}
+            await db.commit()
+            response_cache.invalidate(AVAILABLE_PLAYERS_KEY)
+
+        for login, index in first_index.items():
+            if login in created_ids:
+                results[index] = PlayerBulkResult(index=index, login=login, id=created_ids[login])
+            else:
+                results[index] = PlayerBulkResult(index=index, login=login, detail="Игрок с таким логином уже существует")
+        return results
+
     @staticmethod
     async def login_player(db: AsyncSession, player_data: PlayerLogin) -> Optional[PlayersORM]:
         # через select смотрю есть ли пользователь в бд
@@ -39,6 +85,7 @@ class PlayerService:
         if player and player.password == player_data.password:
             await db.commit()
             await db.refresh(player)
+            response_cache.invalidate(AVAILABLE_PLAYERS_KEY)
             return player
         return None
 
@@ -49,7 +96,27 @@ class PlayerService:
         if player:
             player.status = 0
             await db.commit()
-            await db.refresh(player)
+            response_cache.invalidate(AVAILABLE_PLAYERS_KEY)
+
+    # перевожу игрока в статус "играет" и отмечаю время подключения одним update без предварительного чтения
+    @staticmethod
+    async def set_playing(db: AsyncSession, player_id: int):
+        stmt = (
+            update(PlayersORM)
+            .where(PlayersORM.id == player_id)
+            .values(status=1, last_connected_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        await db.execute(stmt)
+        await db.commit()
+        response_cache.invalidate(AVAILABLE_PLAYERS_KEY)
+
+    # подключался ли игрок после момента since (в том числе через другой воркер)
+    @staticmethod
+    async def reconnected_since(db: AsyncSession, player_id: int, since: datetime) -> bool:
+        stmt = select(PlayersORM.last_connected_at).where(PlayersORM.id == player_id)
+        last_connected_at = (await db.execute(stmt)).scalar_one_or_none()
+        return last_connected_at is not None and last_connected_at > since
 
     @staticmethod
     async def get_available_players(db: AsyncSession) -> List[Player]:
@@ -80,7 +147,8 @@ class PlayerService:
         # обновляю данные
         player.stats += 1 if is_winner else -1
         await db.commit()
-        await db.refresh(player)
+        response_cache.invalidate(AVAILABLE_PLAYERS_KEY)
+        response_cache.invalidate(player_stats_key(player_id))
 
     @staticmethod
     async def get_player_stats(db: AsyncSession, player_id: int) -> PlayerStats:
@@ -99,18 +167,18 @@ class PlayerService:
         wins = 0
         losses = 0
 
-        # опеределяю победы и проигрыши игрока
+        # опеределяю победы и проигрыши игрока, брошенные игры не считаются ни тем, ни другим
         for game in all_games:
             if game.player_1_id == player_id:
-                if game.p_1_res == 1:
-                    wins += 1
-                else:
-                    losses += 1
+                my_res = game.p_1_res
             elif game.player_2_id == player_id:
-                if game.p_2_res == 1:
-                    wins += 1
-                else:
-                    losses += 1
+                my_res = game.p_2_res
+            else:
+                continue
+            if my_res == 1:
+                wins += 1
+            elif my_res != RESULT_ABANDONED:
+                losses += 1
 
         return PlayerStats(
             id=player_orm.id,
@@ -0,0 +1,127 @@
+import cProfile
+import marshal
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import nullcontext
+from datetime import datetime
+from typing import Deque, Dict, List, Optional
+
+from app.db_connect.db import settings
+from app.schemas.admin import ProfilerConfig, ProfileInfo
+
+# профилирование по запросу: пока оно выключено, обработчик платит только за одну проверку флага
+NULL_PROFILE = nullcontext()
+
+# фоновый поток, который периодически снимает стек потока event loop
+# в стек попадают и другие корутины, работавшие в это время, это нормально для поиска узких мест воркера
+class StackSampler:
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts: Counter = Counter()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.counts[";".join(reversed(stack))] += 1
+
+    # формат collapsed stacks: "a;b;c count" на строку, его понимают flamegraph.pl и speedscope
+    def stop(self) -> bytes:
+        self.stop_event.set()
+        self.thread.join()
+        return "".join(f"{stack} {count}\n" for stack, count in self.counts.items()).encode()
+
+class ProfileSession:
+    def __init__(self, name: str, mode: str):
+        self.name = name
+        self.mode = mode
+        self.sampler: Optional[StackSampler] = None
+        self.profiler: Optional[cProfile.Profile] = None
+
+    async def __aenter__(self):
+        ProfilerService.active = True
+        if self.mode == "cprofile":
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        else:
+            self.sampler = StackSampler(threading.get_ident(), settings.PROFILER_SAMPLE_INTERVAL_MS / 1000)
+            self.sampler.start()
+        self.started = time.perf_counter()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        duration_ms = (time.perf_counter() - self.started) * 1000
+        try:
+            if self.profiler is not None:
+                self.profiler.disable()
+                if duration_ms >= ProfilerService.config.threshold_ms:
+                    # тот же формат, что пишет pstats.dump_stats, открывается snakeviz/flameprof
+                    self.profiler.create_stats()
+                    ProfilerService.store(self.name, self.mode, duration_ms, marshal.dumps(self.profiler.stats))
+            else:
+                data = self.sampler.stop()
+                if duration_ms >= ProfilerService.config.threshold_ms:
+                    ProfilerService.store(self.name, self.mode, duration_ms, data)
+        finally:
+            ProfilerService.active = False
+        return False
+
+class ProfilerService:
+    config = ProfilerConfig()
+    # одновременно профилирую только один обработчик: cProfile не допускает двух активных профайлеров,
+    # а снимки стека все равно видят весь поток
+    active = False
+    profiles: Deque[Dict] = deque(maxlen=settings.PROFILER_MAX_PROFILES)
+    next_id = 1
+
+    @staticmethod
+    def profile(name: str, game_id: Optional[int] = None, forced: bool = False):
+        config = ProfilerService.config
+        if not config.enabled or ProfilerService.active:
+            return NULL_PROFILE
+        selected = (
+            (forced and config.allow_request_header)
+            or (game_id is not None and game_id in config.game_ids)
+            or (config.sample_rate > 0 and random.random() < config.sample_rate)
+        )
+        if not selected:
+            return NULL_PROFILE
+        return ProfileSession(name, config.mode)
+
+    @staticmethod
+    def store(name: str, mode: str, duration_ms: float, data: bytes):
+        ProfilerService.profiles.append({
+            "id": ProfilerService.next_id,
+            "name": name,
+            "mode": mode,
+            "duration_ms": duration_ms,
+            "created_at": datetime.utcnow(),
+            "data": data,
+        })
+        ProfilerService.next_id += 1
+
+    @staticmethod
+    def list_profiles() -> List[ProfileInfo]:
+        return [ProfileInfo(**{k: v for k, v in p.items() if k != "data"}) for p in ProfilerService.profiles]
+
+    @staticmethod
+    def get_profile(profile_id: int) -> Optional[Dict]:
+        for profile in ProfilerService.profiles:
+            if profile["id"] == profile_id:
+                return profile
+        return None
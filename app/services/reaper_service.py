@@ -0,0 +1,169 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import update, select, or_
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Iterable, Tuple
+
+from app.db_connect.db import settings, AsyncSessionLocal
+from app.db_models.players import PlayersORM
+from app.db_models.games import GamesORM, RESULT_ABANDONED
+from app.services.cache_service import invalidate_game_caches
+
+logger = logging.getLogger("app.reaper")
+
+class ReaperService:
+    # метрики фоновой очистки, отдаются через /games/reaper/metrics
+    metrics = {
+        "runs": 0,
+        "games_reaped": 0,
+        "players_released": 0,
+        "sockets_closed": 0,
+        "errors": 0,
+        "last_run_at": None,
+        "last_run_duration_ms": 0.0,
+        "last_run_games_reaped": 0,
+        "last_run_players_released": 0,
+        "last_run_sockets_closed": 0,
+    }
+
+    @staticmethod
+    async def touch_games(db: AsyncSession, game_ids: Iterable[int]):
+        # heartbeat: продлеваю жизнь играм, у которых на этом воркере есть открытые сокеты
+        # версию не увеличиваю: last_activity не влияет на ход, иначе heartbeat ломал бы ходы конфликтами
+        # если процесс упал, его игры перестают обновляться и через таймаут будут закрыты
+        game_ids = list(game_ids)
+        if not game_ids:
+            return
+        stmt = (
+            update(GamesORM)
+            .where(GamesORM.id.in_(game_ids), GamesORM.online == True)
+            .values(last_activity=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        await db.execute(stmt)
+        await db.commit()
+
+    @staticmethod
+    async def reap_stale_games(db: AsyncSession, idle_timeout: float, batch_size: int) -> int:
+        # одним запросом закрываю пачку брошенных игр, победитель не назначается:
+        # обоим игрокам пишу результат "брошена", рейтинг (players.stats) при этом не меняется
+        cutoff = datetime.utcnow() - timedelta(seconds=idle_timeout)
+        stale_ids = (
+            select(GamesORM.id)
+            .where(GamesORM.online == True, GamesORM.last_activity < cutoff)
+            .order_by(GamesORM.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        stmt = (
+            update(GamesORM)
+            .where(GamesORM.id.in_(stale_ids))
+            .values(
+                online=False,
+                p_1_res=RESULT_ABANDONED,
+                p_2_res=RESULT_ABANDONED,
+                last_activity=datetime.utcnow(),
+                version=GamesORM.version + 1
+            )
+            .returning(GamesORM.id)
+            .execution_options(synchronize_session=False)
+        )
+        result = await db.execute(stmt)
+        reaped = len(result.all())
+        await db.commit()
+        return reaped
+
+    @staticmethod
+    async def release_stale_players(db: AsyncSession, batch_size: int) -> int:
+        # освобождаю игроков со статусом 1, у которых нет ни одной активной игры
+        in_online_game = (
+            select(GamesORM.id)
+            .where(
+                GamesORM.online == True,
+                or_(GamesORM.player_1_id == PlayersORM.id, GamesORM.player_2_id == PlayersORM.id)
+            )
+            .exists()
+        )
+        stale_ids = (
+            select(PlayersORM.id)
+            .where(PlayersORM.status == 1, ~in_online_game)
+            .order_by(PlayersORM.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        stmt = (
+            update(PlayersORM)
+            .where(PlayersORM.id.in_(stale_ids))
+            .values(status=0)
+            .returning(PlayersORM.id)
+            .execution_options(synchronize_session=False)
+        )
+        result = await db.execute(stmt)
+        released = len(result.all())
+        await db.commit()
+        return released
+
+    @staticmethod
+    async def run_once(manager) -> Tuple[int, int, int]:
+        started = time.perf_counter()
+        sockets_closed = await manager.close_idle_connections(settings.WS_IDLE_TIMEOUT_SECONDS)
+
+        games_reaped = 0
+        players_released = 0
+        async with AsyncSessionLocal() as db:
+            await ReaperService.touch_games(db, manager.active_connections.keys())
+
+            # обрабатываю пачками, пока есть что закрывать
+            while True:
+                reaped = await ReaperService.reap_stale_games(
+                    db, settings.GAME_IDLE_TIMEOUT_SECONDS, settings.REAPER_BATCH_SIZE
+                )
+                games_reaped += reaped
+                if reaped < settings.REAPER_BATCH_SIZE:
+                    break
+
+            while True:
+                released = await ReaperService.release_stale_players(db, settings.REAPER_BATCH_SIZE)
+                players_released += released
+                if released < settings.REAPER_BATCH_SIZE:
+                    break
+
+        if games_reaped or players_released:
+            invalidate_game_caches()
+
+        metrics = ReaperService.metrics
+        metrics["runs"] += 1
+        metrics["games_reaped"] += games_reaped
+        metrics["players_released"] += players_released
+        metrics["sockets_closed"] += sockets_closed
+        metrics["last_run_at"] = datetime.utcnow()
+        metrics["last_run_duration_ms"] = (time.perf_counter() - started) * 1000
+        metrics["last_run_games_reaped"] = games_reaped
+        metrics["last_run_players_released"] = players_released
+        metrics["last_run_sockets_closed"] = sockets_closed
+        return games_reaped, players_released, sockets_closed
+
+    @staticmethod
+    async def run_forever(manager):
+        # фоновая задача, запускается при старте приложения
+        while True:
+            await asyncio.sleep(settings.REAPER_INTERVAL_SECONDS)
+            try:
+                games_reaped, players_released, sockets_closed = await ReaperService.run_once(manager)
+                if games_reaped or players_released or sockets_closed:
+                    logger.info(
+                        "Очистка: закрыто игр %d, освобождено игроков %d, закрыто сокетов %d",
+                        games_reaped, players_released, sockets_closed,
+                        extra={
+                            "games_reaped": games_reaped,
+                            "players_released": players_released,
+                            "sockets_closed": sockets_closed
+                        }
+                    )
+            except Exception:
+                ReaperService.metrics["errors"] += 1
+                logger.exception("Ошибка фоновой очистки")
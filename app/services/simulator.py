@@ -0,0 +1,212 @@
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from multiprocessing import Pool
+from typing import Dict, List, Optional, Tuple
+
+from app.services import game_rules
+from app.services.game_rules import BOARD_SIZE, SHIP_LENGTH, SHIP, SHOT_MISS, SHOT_HIT, SHOT_ALL_SUNK
+
+# headless симулятор партий на тех же правилах, что и GameService, без бд и сети
+# запуск: python -m app.services.simulator --games 1000000 --p1 hunt --p2 random
+
+ALL_CELLS = [(r, c) for r in range(BOARD_SIZE) for c in range(BOARD_SIZE)]
+
+# стратегия: стреляю в случайные клетки без повторов
+class RandomStrategy:
+    def __init__(self, rng: random.Random):
+        self.cells = ALL_CELLS[:]
+        rng.shuffle(self.cells)
+
+    def next_shot(self) -> Tuple[int, int]:
+        return self.cells.pop()
+
+    def observe(self, row: int, col: int, shot: str):
+        pass
+
+# стратегия охоты: случайные выстрелы, а после попадания добиваю корабль по соседним клеткам
+class HuntStrategy:
+    def __init__(self, rng: random.Random):
+        self.cells = ALL_CELLS[:]
+        rng.shuffle(self.cells)
+        self.fired = set()
+        self.targets: List[Tuple[int, int]] = []
+
+    def next_shot(self) -> Tuple[int, int]:
+        while self.targets:
+            cell = self.targets.pop()
+            if cell not in self.fired:
+                self.fired.add(cell)
+                return cell
+        while True:
+            cell = self.cells.pop()
+            if cell not in self.fired:
+                self.fired.add(cell)
+                return cell
+
+    def observe(self, row: int, col: int, shot: str):
+        if shot == SHOT_HIT:
+            for nr, nc in ((row - 1, col), (row + 1, col), (row, col - 1), (row, col + 1)):
+                if 0 <= nr < BOARD_SIZE and 0 <= nc < BOARD_SIZE and (nr, nc) not in self.fired:
+                    self.targets.append((nr, nc))
+        elif shot != SHOT_MISS:
+            # корабль потоплен, соседние клетки больше не интересны
+            self.targets.clear()
+
+STRATEGIES = {
+    "random": RandomStrategy,
+    "hunt": HuntStrategy,
+}
+
+# играю одну партию, ходы чередуются после каждого выстрела, как в вебсокете
+# возвращаю (победитель 1 или 2, число выстрелов)
+def play_game(rng: random.Random, board1: List[List[int]], board2: List[List[int]], p1_strategy: str, p2_strategy: str) -> Tuple[int, int]:
+    # игрок 1 стреляет по доске игрока 2 и наоборот
+    players = (
+        (STRATEGIES[p1_strategy](rng), board2),
+        (STRATEGIES[p2_strategy](rng), board1),
+    )
+    shots = 0
+    turn = 0
+    while True:
+        strategy, target_board = players[turn]
+        row, col = strategy.next_shot()
+        shot = game_rules.fire(target_board, row, col)
+        shots += 1
+        if shot == SHOT_ALL_SUNK:
+            return turn + 1, shots
+        strategy.observe(row, col, shot)
+        turn = 1 - turn
+
+def empty_stats() -> Dict:
+    return {
+        "games": 0,
+        "wins": [0, 0],
+        # распределение длины партии в выстрелах
+        "length_histogram": {},
+        "total_shots": 0,
+        # как часто клетка занята кораблем
+        "ship_cell_counts": [[0] * BOARD_SIZE for _ in range(BOARD_SIZE)],
+        "horizontal_ships": 0,
+        "vertical_ships": 0,
+    }
+
+def record_placement(stats: Dict, board: List[List[int]]):
+    counts = stats["ship_cell_counts"]
+    horizontal_links = 0
+    vertical_links = 0
+    for r in range(BOARD_SIZE):
+        board_row = board[r]
+        counts_row = counts[r]
+        for c in range(BOARD_SIZE):
+            if board_row[c] == SHIP:
+                counts_row[c] += 1
+                if c + 1 < BOARD_SIZE and board_row[c + 1] == SHIP:
+                    horizontal_links += 1
+                if r + 1 < BOARD_SIZE and board[r + 1][c] == SHIP:
+                    vertical_links += 1
+    # корабль длиной SHIP_LENGTH дает SHIP_LENGTH - 1 соседних пар клеток
+    stats["horizontal_ships"] += horizontal_links // (SHIP_LENGTH - 1)
+    stats["vertical_ships"] += vertical_links // (SHIP_LENGTH - 1)
+
+# пачка партий в одном процессе, наружу отдаю только агрегаты
+def run_batch(args: Tuple[int, int, str, str]) -> Dict:
+    seed, games, p1_strategy, p2_strategy = args
+    rng = random.Random(seed)
+    stats = empty_stats()
+    histogram = stats["length_histogram"]
+    for _ in range(games):
+        board1 = game_rules.generate_board(rng)
+        board2 = game_rules.generate_board(rng)
+        record_placement(stats, board1)
+        record_placement(stats, board2)
+
+        winner, shots = play_game(rng, board1, board2, p1_strategy, p2_strategy)
+        stats["games"] += 1
+        stats["wins"][winner - 1] += 1
+        stats["total_shots"] += shots
+        histogram[shots] = histogram.get(shots, 0) + 1
+    return stats
+
+def merge_stats(total: Dict, part: Dict):
+    total["games"] += part["games"]
+    total["wins"][0] += part["wins"][0]
+    total["wins"][1] += part["wins"][1]
+    total["total_shots"] += part["total_shots"]
+    for shots, count in part["length_histogram"].items():
+        total["length_histogram"][shots] = total["length_histogram"].get(shots, 0) + count
+    for r in range(BOARD_SIZE):
+        for c in range(BOARD_SIZE):
+            total["ship_cell_counts"][r][c] += part["ship_cell_counts"][r][c]
+    total["horizontal_ships"] += part["horizontal_ships"]
+    total["vertical_ships"] += part["vertical_ships"]
+
+def summarize(stats: Dict, elapsed: float) -> Dict:
+    games = stats["games"] or 1
+    boards = 2 * games
+    return {
+        "games": stats["games"],
+        "games_per_sec": round(stats["games"] / elapsed, 1) if elapsed > 0 else None,
+        "p1_win_rate": stats["wins"][0] / games,
+        "p2_win_rate": stats["wins"][1] / games,
+        "avg_shots": stats["total_shots"] / games,
+        "length_histogram": dict(sorted(stats["length_histogram"].items())),
+        "ship_cell_frequency": [[round(count / boards, 4) for count in row] for row in stats["ship_cell_counts"]],
+        "horizontal_ship_share": stats["horizontal_ships"] / max(stats["horizontal_ships"] + stats["vertical_ships"], 1),
+    }
+
+# раскидываю партии по пулу процессов и по мере готовности пачек пишу промежуточные итоги (NDJSON)
+def simulate(
+    games: int,
+    p1_strategy: str = "random",
+    p2_strategy: str = "random",
+    workers: Optional[int] = None,
+    batch_size: int = 2000,
+    seed: int = 0,
+    out=sys.stdout,
+) -> Dict:
+    batches = []
+    remaining = games
+    batch_index = 0
+    while remaining > 0:
+        size = min(batch_size, remaining)
+        batches.append((seed * 1_000_003 + batch_index, size, p1_strategy, p2_strategy))
+        remaining -= size
+        batch_index += 1
+
+    total = empty_stats()
+    started = time.perf_counter()
+    with Pool(processes=workers or os.cpu_count()) as pool:
+        for part in pool.imap_unordered(run_batch, batches):
+            merge_stats(total, part)
+            elapsed = time.perf_counter() - started
+            progress = {
+                "type": "progress",
+                "games": total["games"],
+                "games_per_sec": round(total["games"] / elapsed, 1),
+                "p1_win_rate": total["wins"][0] / total["games"],
+            }
+            out.write(json.dumps(progress) + "\n")
+            out.flush()
+
+    summary = summarize(total, time.perf_counter() - started)
+    out.write(json.dumps({"type": "summary", **summary}) + "\n")
+    out.flush()
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description="Симуляция партий морского боя без бд")
+    parser.add_argument("--games", type=int, default=100_000)
+    parser.add_argument("--p1", choices=sorted(STRATEGIES), default="random")
+    parser.add_argument("--p2", choices=sorted(STRATEGIES), default="random")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    simulate(args.games, args.p1, args.p2, args.workers, args.batch_size, args.seed)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+from app.db_connect.query_stats import assert_endpoint_query_budget, assert_response_query_budget
+from app.services.game_rules import SHIP
+from conftest import receive_until, unique_prefix
+
+# каждый эндпоинт с бюджетом из QUERY_BUDGETS: лишний запрос (N+1, повторное чтение) роняет тест
+
+def test_player_endpoints_within_budget(client):
+    prefix = unique_prefix()
+    response = client.post("/players/register", json={"login": f"{prefix}_one", "password": "secret"})
+    assert response.status_code == 200
+    assert_response_query_budget(response, "POST /players/register")
+    player_id = response.json()["id"]
+
+    response = client.post(
+        "/players/register/bulk",
+        json=[{"login": f"{prefix}_{i}", "password": "secret"} for i in range(50)]
+    )
+    assert response.status_code == 200
+    assert_response_query_budget(response, "POST /players/register/bulk")
+
+    response = client.post("/players/login", json={"login": f"{prefix}_one", "password": "secret"})
+    assert response.status_code == 200
+    assert_response_query_budget(response, "POST /players/login")
+
+    response = client.get("/players/")
+    assert response.status_code == 200
+    assert_response_query_budget(response, "GET /players/")
+
+    response = client.get(f"/players/{player_id}/stats")
+    assert response.status_code == 200
+    assert_response_query_budget(response, "GET /players/{player_id}/stats")
+
+def test_game_endpoints_within_budget(client, make_players):
+    player1_id, player2_id, *bulk_ids = make_players(102)
+
+    response = client.post("/games/create", json={"player_1_id": player1_id, "player_2_id": player2_id})
+    assert response.status_code == 200
+    assert_response_query_budget(response, "POST /games/create")
+
+    pairings = [{"player_1_id": bulk_ids[2 * i], "player_2_id": bulk_ids[2 * i + 1]} for i in range(50)]
+    response = client.post("/games/create/bulk", json=pairings)
+    assert response.status_code == 200
+    assert_response_query_budget(response, "POST /games/create/bulk")
+
+    response = client.get("/games/")
+    assert response.status_code == 200
+    assert_response_query_budget(response, "GET /games/")
+
+# отыгрываю партию до конца: игрок 1 стреляет по кораблям соперника, игрок 2 - по клеткам подряд
+def test_websocket_auth_and_moves_within_budget(client, make_games):
+    [(game_id, player1_id, player2_id)] = make_games(1)
+
+    with client.websocket_connect(f"/games/{game_id}/play") as socket1, \
+            client.websocket_connect(f"/games/{game_id}/play") as socket2:
+        socket1.send_json({"type": "auth", "player_id": player1_id})
+        opponent_board = receive_until(socket1, "game_start")["opponent_board"]
+        socket2.send_json({"type": "auth", "player_id": player2_id})
+        receive_until(socket2, "game_start")
+
+        ship_cells = [
+            (row, col)
+            for row, cells in enumerate(opponent_board)
+            for col, value in enumerate(cells)
+            if value == SHIP
+        ]
+        size = len(opponent_board)
+        for index, (row, col) in enumerate(ship_cells):
+            socket1.send_json({"type": "move", "row": row, "col": col})
+            result = receive_until(socket1, "move_result")
+            receive_until(socket2, "move_result")
+            if result["is_game_over"]:
+                break
+            socket2.send_json({"type": "move", "row": index // size, "col": index % size})
+            receive_until(socket2, "move_result")
+            receive_until(socket1, "move_result")
+
+        assert result["is_game_over"]
+        receive_until(socket1, "game_over")
+        receive_until(socket2, "game_over")
+
+    assert_endpoint_query_budget("WS connect")
+    assert_endpoint_query_budget("WS auth")
+    assert_endpoint_query_budget("WS move")
+    assert_endpoint_query_budget("WS move game_over")
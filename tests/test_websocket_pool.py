@@ -0,0 +1,44 @@
+from contextlib import ExitStack
+
+from sqlalchemy import event
+
+from app.db_connect.db import engine, settings
+from conftest import receive_until
+
+SOCKETS = 1000
+
+# сокет держит соединение с бд только на время единицы работы (auth, ход),
+# поэтому 1000 одновременных игр обслуживаются пулом из 10 соединений
+def test_thousand_sockets_share_pool_of_ten(client, make_games):
+    assert settings.DB_POOL_SIZE == 10 and settings.DB_MAX_OVERFLOW == 0
+    games = make_games(SOCKETS)
+
+    checked_out = []
+
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        checked_out.append(engine.pool.checkedout())
+
+    event.listen(engine.sync_engine, "checkout", on_checkout)
+    try:
+        with ExitStack() as stack:
+            sockets = []
+            for game_id, player1_id, _ in games:
+                websocket = stack.enter_context(client.websocket_connect(f"/games/{game_id}/play"))
+                websocket.send_json({"type": "auth", "player_id": player1_id})
+                game_start = receive_until(websocket, "game_start")
+                assert game_start["turn"] == player1_id
+                sockets.append(websocket)
+
+            # все сокеты открыты одновременно, ход каждого проходит через тот же пул
+            for websocket, (_, player1_id, player2_id) in zip(sockets, games):
+                websocket.send_json({"type": "move", "row": 0, "col": 0})
+                move_result = receive_until(websocket, "move_result")
+                assert move_result["player_who_moved"] == player1_id
+                assert move_result["turn"] == player2_id
+
+            assert engine.pool.checkedout() <= settings.DB_POOL_SIZE
+    finally:
+        event.remove(engine.sync_engine, "checkout", on_checkout)
+
+    assert checked_out
+    assert max(checked_out) <= settings.DB_POOL_SIZE